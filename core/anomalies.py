@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+from core.data import province_map
+
+# 행정동 일별 이상 징후
+# 모든 행정동의 일별 내원·신환 수를 (행정동 × 일자) 행렬로 만들어 한 번에 점수를 매긴다 — 행정동별 반복 없이 요일 시차만 돈다.
+# - 기대값: 같은 요일 직전 WEEKS주 평균 (휴진 요일 같은 요일 패턴을 그대로 따른다)
+# - 점수: (실제 - 기대) / 표준편차. 건수가 적은 행정동이 한두 건에 튀지 않도록 분산은 기대값(포아송) 이상, 1 이상으로 둔다.
+# - |점수| ≥ 기준이면서 실제나 기대가 MIN_COUNT건 이상인 칸만 표시한다. 병원 전체가 쉰 날(전 지역 0건)은 제외.
+
+WEEKS = 8
+THRESHOLD = 3.5
+MIN_COUNT = 3
+BLOCK = 128
+REGION_COLUMNS = ['시/도', '시/군/구', '행정동']
+
+
+def region_daily_matrix(df):
+    """(행정동 표, 일자 인덱스, {'내원': 행정동×일자 진료 건수, '신환': 행정동×일자 신환 수}). 행정동이 비어 있는 기록은 뺀다."""
+    rows = df.loc[df['행정동'].str.strip().astype(bool), ['진료일자', '환자번호', '초/재진', *REGION_COLUMNS]]
+    if len(rows) == 0:
+        return pd.DataFrame(columns=REGION_COLUMNS), pd.DatetimeIndex([]), {}
+    days = rows['진료일자'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    first = days.min()
+    n_days = int(days.max() - first + 1)
+    # 세 열을 따로 factorize해 합친 정수 키로 다시 factorize (MultiIndex보다 훨씬 빠르다)
+    key = np.zeros(len(rows), dtype=np.int64)
+    levels = []
+    for col in REGION_COLUMNS:
+        col_codes, uniques = pd.factorize(rows[col])
+        key = key * len(uniques) + col_codes
+        levels.append((col, uniques, len(uniques)))
+    codes, keys = pd.factorize(key)
+    regions = {}
+    for col, uniques, size in reversed(levels):
+        regions[col] = np.asarray(uniques, dtype=object)[keys % size]
+        keys = keys // size
+    regions = pd.DataFrame({col: regions[col] for col in REGION_COLUMNS})
+    cells = codes * n_days + (days - first)
+
+    def grid(mask):
+        counts = np.bincount(cells[mask], minlength=len(regions) * n_days).reshape(len(regions), n_days)
+        return counts.astype(np.int32)
+
+    # 신환은 하루 한 환자 한 번
+    new = (rows['초/재진'] == '신환').to_numpy().copy()
+    new[new] = ~rows.loc[new, ['진료일자', '환자번호']].duplicated().to_numpy()
+
+    regions['시/도'] = regions['시/도'].map(province_map).fillna(regions['시/도'])
+    index = pd.date_range(pd.Timestamp(int(first), unit='D'), periods=n_days, freq='D')
+    return regions, index, {"내원": grid(slice(None)), "신환": grid(new)}
+
+
+def weekday_scores(counts, weeks=WEEKS):
+    """(기대값, 점수) 행렬 — 같은 요일 직전 weeks주 대비. 이력이 weeks주보다 짧은 앞쪽 날은 NaN.
+    행렬이 커서 float32로 제자리 연산한다 (행정동 하루 건수 범위에서는 제곱합까지 정확하다)."""
+    values = counts.astype(np.float32)
+    squares = values * values
+    expected = np.zeros_like(values)
+    spread = np.zeros_like(values)
+    for k in range(1, weeks + 1):
+        lag = 7 * k
+        expected[:, lag:] += values[:, :-lag]
+        spread[:, lag:] += squares[:, :-lag]
+    expected /= weeks
+    spread /= weeks
+    # 분산 = 제곱 평균 - 평균 제곱, 단 기대값(포아송)과 1 이상
+    spread -= expected * expected
+    np.maximum(spread, expected, out=spread)
+    np.maximum(spread, 1, out=spread)
+    np.sqrt(spread, out=spread)
+    score = np.subtract(values, expected, out=squares)
+    score /= spread
+    expected[:, :7 * weeks] = np.nan
+    score[:, :7 * weeks] = np.nan
+    return expected, score
+
+
+def scan(matrix, since=None, threshold=THRESHOLD):
+    """since 이후 날짜의 이상 징후 표 (최근 날짜, 점수 크기 순).
+    행정동 BLOCK개씩 끊어 점수를 매긴다 — 중간 행렬이 캐시에 들어가 전체를 한 번에 계산하는 것보다 빠르다."""
+    regions, index, series = matrix
+    if not series:
+        return pd.DataFrame()
+    # since 이전은 기대값 계산에 필요한 WEEKS주만 남긴다
+    first = 0 if since is None else max(int(index.searchsorted(pd.Timestamp(since))) - 7 * WEEKS, 0)
+    index = index[first:]
+    scored = np.asarray(index >= pd.Timestamp(since)) if since is not None else np.ones(len(index), dtype=bool)
+    # 병원 전체가 쉰 날 제외
+    scored &= series["내원"][:, first:].sum(axis=0) > 0
+
+    frames = []
+    for name, counts in series.items():
+        counts = counts[:, first:]
+        found = []
+        for start in range(0, len(counts), BLOCK):
+            block = counts[start:start + BLOCK]
+            expected, score = weekday_scores(block)
+            with np.errstate(invalid="ignore"):
+                hit = np.abs(score) >= threshold
+            hit &= (block >= MIN_COUNT) | (expected >= MIN_COUNT)
+            hit &= scored
+            region, day = np.nonzero(hit)
+            found.append((region + start, day, block[region, day], expected[region, day], score[region, day]))
+        region, day, actual, expected, score = (np.concatenate(parts) for parts in zip(*found))
+        frames.append(regions.iloc[region].reset_index(drop=True).assign(
+            진료일자=index[day],
+            지표=name,
+            실제=actual,
+            기대=expected.round(1),
+            점수=score.round(1),
+            구분=np.where(score > 0, "급증", "급감"),
+        ))
+    flagged = pd.concat(frames, ignore_index=True)
+    return (
+        flagged.assign(크기=flagged['점수'].abs())
+        .sort_values(['진료일자', '크기'], ascending=[False, False])
+        .drop(columns='크기')
+        .reset_index(drop=True)
+    )
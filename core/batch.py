@@ -0,0 +1,189 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from core import campaign as cp
+
+# 캠페인 일괄 평가
+# 여러 캠페인(기간·비교 기준·타겟 행정동)의 KPI·순수 효과(신뢰구간 포함)·재방문을 한 표로 계산한다.
+# - 모든 캠페인이 읽는 기간(campaign_windows)의 합집합을 필요한 열만 남겨 한 번 잘라 두고(공유 요약)
+#   워커마다 한 번씩만 넘긴다. 캠페인별 계산은 이 요약 위에서만 돈다.
+# - 캠페인별 평가는 pandas 연산 위주라 스레드로는 GIL에 묶이므로 프로세스 풀에서 병렬로 실행한다.
+#   (Streamlit 서버 안에서도 안전하도록 spawn으로 워커를 띄운다)
+# 사용: python -m core.batch campaigns.json [--out 결과.csv]
+#   campaigns.json — [{"캠페인": "봄 전단", "시작일": "2025-03-01", "종료일": "2025-03-31",
+#                      "비교 기준": "전년 동기", "타겟 지역": ["배곧1동", "배곧2동"]}, ...]
+#   CSV도 같은 열 이름으로 받는다 (타겟 지역은 쉼표로 구분). 데이터 원천은 DASHBOARD_DATA_SOURCE 등 설정을 따른다.
+
+WORKERS = os.cpu_count() or 1
+# 캠페인 수 × 요약 행 수가 이보다 작으면 순차 실행 — 워커를 띄우는 비용(프로세스당 1~2초)이 계산보다 크다
+# (캠페인 하나는 요약 10만 행에 약 40ms)
+PARALLEL_MIN_WORK = 10_000_000
+COLUMNS = ['진료일자', '환자번호', '초/재진', '행정동', '방문순번', '다음방문일수']
+# 입력 열(화면 표·CSV·JSON) → 캠페인 설정 키 (core.campaign.default_settings와 같은 키)
+FIELDS = {
+    "캠페인": "name",
+    "시작일": "campaign_start",
+    "종료일": "campaign_end",
+    "비교 기준": "comparison_option",
+    "비교 시작일": "custom_before_start",
+    "비교 종료일": "custom_before_end",
+    "타겟 지역": "target_regions",
+}
+
+
+def _date(value):
+    if value is None or (not isinstance(value, (list, tuple)) and pd.isna(value)):
+        return None
+    return pd.Timestamp(value).date()
+
+
+def campaign_spec(raw, index=0):
+    """입력 한 행(dict) → 캠페인 설정. 잘못된 입력은 ValueError."""
+    spec = {FIELDS.get(k, k): v for k, v in raw.items()}
+    name = spec.get("name")
+    name = str(name).strip() if isinstance(name, str) and name.strip() else f"캠페인 {index + 1}"
+
+    start, end = _date(spec.get("campaign_start")), _date(spec.get("campaign_end"))
+    if start is None or end is None:
+        raise ValueError(f"{name}: 시작일과 종료일을 입력하세요.")
+    if start >= end:
+        raise ValueError(f"{name}: 종료일은 시작일보다 이후여야 합니다.")
+
+    option = spec.get("comparison_option") or "이전 동일 기간"
+    if option not in cp.COMPARISON_OPTIONS:
+        raise ValueError(f"{name}: 비교 기준은 {', '.join(cp.COMPARISON_OPTIONS)} 중 하나여야 합니다.")
+    before_start, before_end = _date(spec.get("custom_before_start")), _date(spec.get("custom_before_end"))
+    if option == "사용자 지정" and (before_start is None or before_end is None or before_start > before_end):
+        raise ValueError(f"{name}: 사용자 지정 비교 기간을 확인하세요.")
+
+    targets = spec.get("target_regions") or []
+    if isinstance(targets, str):
+        targets = targets.split(",")
+    return {
+        "name": name,
+        "campaign_start": start,
+        "campaign_end": end,
+        "comparison_option": option,
+        "custom_before_start": before_start or start,
+        "custom_before_end": before_end or start,
+        "target_regions": [t.strip() for t in targets if t.strip()],
+    }
+
+
+def summary_frame(df, specs):
+    """모든 캠페인이 읽는 기간의 합집합 × 평가에 쓰는 열 — 진료 기록을 한 번만 훑는다."""
+    dates = df['진료일자']
+    mask = pd.Series(False, index=df.index)
+    for spec in specs:
+        params = cp.campaign_params(spec)
+        for lo, hi in cp.campaign_windows(
+            params["campaign_start"], params["campaign_end"], params["before_start"], params["before_end"]
+        ):
+            mask |= (dates >= pd.Timestamp(lo)) & (dates <= pd.Timestamp(hi))
+    return df.loc[mask, COLUMNS].reset_index(drop=True)
+
+
+def evaluate(data, spec):
+    """캠페인 하나의 KPI·순수 효과·재방문 → 결과 표 한 행."""
+    params = cp.campaign_params(spec)
+    start, end = params["campaign_start"], params["campaign_end"]
+    before_start, before_end = params["before_start"], params["before_end"]
+    targets = params["target_regions"]
+
+    campaign_data, before_data, after_data = cp.campaign_periods(data, start, end, before_start, before_end)
+    campaign_target, campaign_non_target = cp.split_target(campaign_data, targets)
+    before_target, before_non_target = cp.split_target(before_data, targets)
+    kpis = cp.campaign_kpis(campaign_target, before_target)
+    lift = cp.new_patient_lift(campaign_target, before_target, campaign_non_target, before_non_target)
+    ci = cp.lift_intervals(campaign_data, before_data, targets)
+
+    revisit = None
+    if len(after_data) > 0:
+        new_ids = cp.new_patient_rows(campaign_data, targets)['환자번호'].unique()
+        before_new_ids = cp.new_patient_rows(before_data, targets)['환자번호'].unique()
+        revisit = cp.revisit_metrics(data, new_ids, before_new_ids, end, before_end)
+
+    return {
+        "캠페인": spec["name"],
+        "캠페인 기간": f"{start} ~ {end}",
+        "비교 기간": f"{before_start} ~ {before_end}",
+        "타겟 지역": ", ".join(targets) if targets else "전체",
+        "신환 수": kpis["new_patients_campaign"],
+        "비교 신환 수": kpis["new_patients_before"],
+        "신환 증가율(%)": kpis["new_patient_growth"],
+        "환자 증가율(%)": kpis["patient_growth"],
+        "신환 비율 변화(%p)": kpis["new_ratio_change"],
+        "인당 진료횟수 변화": kpis["visits_per_patient_change"],
+        "순수 효과(%p)": lift["new_lift"] if lift else None,
+        "순수 효과 하한": ci["new_lift"][0] if lift and ci["new_lift"] else None,
+        "순수 효과 상한": ci["new_lift"][1] if lift and ci["new_lift"] else None,
+        "30일 재방문율(%)": revisit["revisit_rate"] if revisit else None,
+        "비교 30일 재방문율(%)": revisit["before_revisit_rate"] if revisit else None,
+        "7일 재방문율(%)": revisit["retention_7d_rate"] if revisit else None,
+    }
+
+
+# 프로세스 풀 워커 — 공유 요약은 워커가 뜰 때 한 번만 받는다
+_summary = None
+
+
+def _init_worker(data):
+    global _summary
+    _summary = data
+
+
+def _evaluate_shared(spec):
+    return evaluate(_summary, spec)
+
+
+def evaluate_all(df, specs, workers=None):
+    """캠페인 목록 → 캠페인별 결과 표 (입력 순서). 계산량이 충분히 크면 프로세스 풀에서 병렬로."""
+    if not specs:
+        return pd.DataFrame()
+    data = summary_frame(df, specs)
+    workers = min(len(specs), workers or WORKERS)
+    if workers <= 1 or len(specs) * len(data) < PARALLEL_MIN_WORK:
+        rows = [evaluate(data, spec) for spec in specs]
+    else:
+        with ProcessPoolExecutor(
+            workers, mp_context=mp.get_context("spawn"), initializer=_init_worker, initargs=(data,)
+        ) as pool:
+            rows = list(pool.map(_evaluate_shared, specs))
+    return pd.DataFrame(rows)
+
+
+def read_specs(path):
+    """JSON(목록) 또는 CSV 파일 → 캠페인 설정 목록."""
+    path = Path(path)
+    if path.suffix == ".csv":
+        records = pd.read_csv(path, keep_default_na=False, encoding="utf-8-sig").to_dict("records")
+    else:
+        records = json.loads(path.read_text(encoding="utf-8"))
+    return [campaign_spec(r, i) for i, r in enumerate(records)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="여러 캠페인의 KPI·순수 효과·재방문 일괄 평가")
+    parser.add_argument("campaigns", help="캠페인 목록 JSON 또는 CSV")
+    parser.add_argument("--workers", type=int, default=None, help=f"프로세스 수 (기본 {WORKERS})")
+    parser.add_argument("--out", type=Path, help="결과 CSV 저장 경로")
+    args = parser.parse_args()
+
+    from streamlit.logger import set_log_level
+
+    from core.data import prepare_visits, visit_sequence
+    from core.sources import VISITS, make_source
+
+    set_log_level("error")
+    specs = read_specs(args.campaigns)
+    result = evaluate_all(visit_sequence(prepare_visits(make_source().read(VISITS))), specs, args.workers)
+    if args.out:
+        result.to_csv(args.out, index=False, encoding="utf-8-sig")
+    with pd.option_context("display.max_columns", None, "display.width", 250, "display.float_format", "{:.1f}".format):
+        print(result.to_string(index=False))
@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import warnings
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from streamlit.logger import set_log_level
+
+from core import anomalies, campaign, patients, penetration, synthetic
+from core.cohorts import CohortRetention
+from core.comparison import compare_periods, monthly_growth, segment_kpis, year_offsets
+from core.data import freeze, patient_table, prepare_population, prepare_visits, stamp, visit_sequence
+
+# 계산 벤치마크
+# 세 페이지의 계산 함수(core/patients·comparison·penetration·campaign, 선택적으로 core/duck)를
+# Streamlit 없이 합성 데이터(core/synthetic.py) 여러 규모에서 측정하고, JSON 기준선과 비교해 회귀를 표시한다.
+# 사용:
+#   python -m core.bench --save .bench/baseline.json              # 기준선 기록
+#   python -m core.bench --compare .bench/baseline.json           # 기준선 대비 (회귀가 있으면 종료 코드 1)
+#   python -m core.bench --scales 10000 1000000 --filter 마케팅    # 규모·케이스 선택
+
+DEFAULT_SCALES = [10_000, 100_000, 1_000_000]
+THRESHOLD = 0.2     # 기준선 대비 중앙값이 20% 넘게 느려지면 회귀
+NOISE_MS = 1.0      # 이보다 작은 절대 차이는 측정 잡음으로 보고 무시
+MIN_RUNS = 3
+MAX_RUNS = 20
+MIN_SECONDS = 0.5   # 케이스당 최소 측정 시간
+
+
+def build_context(rows, seed=0):
+    """rows행 합성 데이터로 페이지 기본 화면과 같은 입력(공유 프레임·기본 필터·캠페인 설정)을 만든다."""
+    raw = synthetic.generate_visits(rows, seed=seed)
+    df = stamp(freeze(visit_sequence(prepare_visits(raw))))
+    pop_df = stamp(freeze(prepare_population(synthetic.generate_population(seed, raw))))
+    patient_df, _ = patient_table(df)
+
+    filters = patients.default_filters(df)
+    view = patients.view_params(filters)
+    segment = patients.filter_segment(df, filters["age_band"], filters["gender"])
+    filtered = patients.filter_period(segment, view["start"], view["end"])
+    comp_daily, _ = compare_periods(segment, view["start"], view["end"], year_offsets(1))
+
+    # 캠페인 — 데이터 끝에서 45일 전을 '오늘'로 두어 캠페인 후 30일 구간에도 데이터가 있게 한다
+    dong_options = sorted(df.loc[campaign.has_dong(df), '행정동'].unique().tolist())
+    today = (df['진료일자'].max() - timedelta(days=45)).date()
+    params = campaign.campaign_params(campaign.default_settings(dong_options, today))
+    start, end = params["campaign_start"], params["campaign_end"]
+    periods = campaign.campaign_periods(df, start, end, params["before_start"], params["before_end"])
+    # 페이지처럼 캠페인·비교 기간과 각 전후 30일만 (visits_for)
+    window = df[np.logical_or.reduce([
+        (df['진료일자'] >= pd.Timestamp(lo)) & (df['진료일자'] <= pd.Timestamp(hi))
+        for lo, hi in campaign.campaign_windows(start, end, params["before_start"], params["before_end"])
+    ])]
+    targets = campaign.split_target(periods[0], params["target_regions"]) + campaign.split_target(periods[1], params["target_regions"])
+    new_campaign, new_before = (campaign.new_patient_rows(p, params["target_regions"]) for p in periods[:2])
+
+    # 지역별 성과는 기간 길이에 비례 — 기본 30일 캠페인과 별도로 최근 1년 vs 그 전 1년도 잰다
+    year_end = df['진료일자'].max()
+    year = campaign.period_rows(df, year_end - timedelta(days=364), year_end)
+    before_year = campaign.period_rows(df, year_end - timedelta(days=729), year_end - timedelta(days=365))
+
+    # 코호트 증분 갱신 — 마지막 달이 빠진 스냅샷과 전체 스냅샷을 오간다
+    last_month = year_end.to_period('M').start_time
+    retention = CohortRetention()
+    retention.update(df)
+
+    province, city = pop_df.index[0][:2]
+    return {
+        "df": df, "pop_df": pop_df, "patient_df": patient_df, "region_matrix": anomalies.region_daily_matrix(df),
+        "filters": filters, "view": view, "segment": segment, "filtered": filtered, "comp_daily": comp_daily,
+        "cutoff": penetration.active_cutoff(penetration.DEFAULT_MONTHS), "province": province, "city": city,
+        "params": params, "periods": periods, "targets": targets, "window": window,
+        "new_ids": new_campaign['환자번호'].unique(), "before_new_ids": new_before['환자번호'].unique(),
+        "year": year, "before_year": before_year,
+        "retention": retention, "new_matrix": campaign.daily_new_matrix(df), "df_prev": df[df['진료일자'] < last_month],
+    }
+
+
+def _cases():
+    """케이스 이름 → 입력 컨텍스트를 받아 한 번 계산하는 함수."""
+    def v(c):
+        return c["view"]
+
+    cases = {
+        # 공유 프레임 파생 열
+        "데이터.방문순번": lambda c: visit_sequence(c["df"]),
+        # 환자정보
+        "환자정보.세그먼트": lambda c: patients.filter_segment(c["df"], c["filters"]["age_band"], "F"),
+        "환자정보.비교(전년)": lambda c: compare_periods(c["segment"], v(c)["start"], v(c)["end"], year_offsets(1)),
+        "환자정보.비교(5년)": lambda c: compare_periods(c["segment"], v(c)["start"], v(c)["end"], year_offsets(5)),
+        "환자정보.세그먼트KPI": lambda c: segment_kpis(c["df"], v(c)["start"], v(c)["end"]),
+        "환자정보.월간성장률": lambda c: monthly_growth(c["comp_daily"], period=1),
+        "환자정보.추이(일별+이동평균)": lambda c: patients.visit_trend(c["filtered"], "일별"),
+        "환자정보.추이(월별)": lambda c: patients.visit_trend(c["filtered"], "월별"),
+        "환자정보.히트맵": lambda c: patients.weekday_hour_heatmap(c["filtered"]),
+        "환자정보.지도": lambda c: patients.patient_points(c["filtered"]),
+        "환자정보.연령대": lambda c: patients.age_distribution(c["filtered"]),
+        # 지역장악도
+        "지역장악도.환자테이블": lambda c: patient_table(c["df"]),
+        "지역장악도.전체": lambda c: penetration.penetration_view(c["patient_df"], c["pop_df"], c["cutoff"], "전체", "전체", "전체"),
+        "지역장악도.시군구": lambda c: penetration.penetration_view(c["patient_df"], c["pop_df"], c["cutoff"], c["province"], c["city"], "전체"),
+        "지역장악도.일별행렬": lambda c: anomalies.region_daily_matrix(c["df"]),
+        "지역장악도.이상징후(전체)": lambda c: anomalies.scan(c["region_matrix"]),
+        # 마케팅성과분석
+        "마케팅.기간분할": lambda c: campaign.campaign_periods(
+            c["df"], c["params"]["campaign_start"], c["params"]["campaign_end"], c["params"]["before_start"], c["params"]["before_end"]),
+        "마케팅.KPI": lambda c: campaign.campaign_kpis(c["targets"][0], c["targets"][2]),
+        "마케팅.순수효과": lambda c: campaign.new_patient_lift(*c["targets"]),
+        "마케팅.신뢰구간": lambda c: campaign.lift_intervals(c["periods"][0], c["periods"][1], c["params"]["target_regions"]),
+        "마케팅.트렌드": lambda c: campaign.daily_new_trend(
+            c["df"], c["params"]["campaign_start"], c["params"]["campaign_end"], c["params"]["target_regions"]),
+        "마케팅.지역": lambda c: campaign.region_performance(c["periods"][0], c["periods"][1], c["params"]["target_regions"]),
+        "마케팅.지역(1년)": lambda c: campaign.region_performance(c["year"], c["before_year"], c["params"]["target_regions"]),
+        "마케팅.코호트(전체)": lambda c: CohortRetention().update(c["df"]),
+        "마케팅.코호트(증분×2)": lambda c: (c["retention"].update(c["df_prev"]), c["retention"].update(c["df"])),
+        "마케팅.일별신환행렬": lambda c: campaign.daily_new_matrix(c["df"]),
+        "마케팅.기준선": lambda c: campaign.expected_baseline(
+            c["new_matrix"], c["params"]["campaign_start"], c["params"]["campaign_end"], c["params"]["target_regions"]),
+        "마케팅.재방문": lambda c: campaign.revisit_metrics(
+            c["window"], c["new_ids"], c["before_new_ids"], c["params"]["campaign_end"], c["params"]["before_end"]),
+    }
+    from core import duck
+    if duck.duckdb is not None:
+        cases["duckdb.비교(전년)"] = lambda c: duck.compare_periods(
+            c["df"], v(c)["start"], v(c)["end"], year_offsets(1), c["filters"]["age_band"], c["filters"]["gender"])
+        cases["duckdb.지역"] = lambda c: duck.region_performance(
+            c["df"], c["params"]["campaign_start"], c["params"]["campaign_end"],
+            c["params"]["before_start"], c["params"]["before_end"], c["params"]["target_regions"])
+    return cases
+
+
+def measure(func, ctx):
+    """첫 실행(워밍업)을 빼고 MIN_RUNS회 이상, MIN_SECONDS 이상 반복한 ms 통계."""
+    func(ctx)
+    times = []
+    began = time.perf_counter()
+    while len(times) < MAX_RUNS and (len(times) < MIN_RUNS or time.perf_counter() - began < MIN_SECONDS):
+        t0 = time.perf_counter()
+        func(ctx)
+        times.append((time.perf_counter() - t0) * 1000)
+    return {"median_ms": round(statistics.median(times), 3), "min_ms": round(min(times), 3), "runs": len(times)}
+
+
+def run(scales, pattern=None, seed=0):
+    cases = {name: f for name, f in _cases().items() if not pattern or pattern in name}
+    results = {}
+    for rows in scales:
+        t0 = time.perf_counter()
+        ctx = build_context(rows, seed)
+        print(f"# {rows:,}행 — 입력 준비 {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+        results[str(rows)] = {}
+        for name, func in cases.items():
+            stats = measure(func, ctx)
+            results[str(rows)][name] = stats
+            print(f"{rows:>10,}  {name:<28} {stats['median_ms']:>10.2f}ms (min {stats['min_ms']:.2f}, {stats['runs']}회)", file=sys.stderr)
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=THRESHOLD):
+    """(규모, 케이스, 기준 ms, 현재 ms, 비율, 회귀 여부) 목록 — 양쪽에 모두 있는 케이스만."""
+    rows = []
+    for scale, cases in current["results"].items():
+        for name, stats in cases.items():
+            base = baseline["results"].get(scale, {}).get(name)
+            if base is None:
+                continue
+            before, after = base["median_ms"], stats["median_ms"]
+            ratio = after / before if before else float("inf")
+            regressed = ratio > 1 + threshold and after - before > NOISE_MS
+            rows.append((scale, name, before, after, ratio, regressed))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="페이지 계산 함수 벤치마크 (합성 데이터)")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES)
+    parser.add_argument("--filter", help="케이스 이름에 이 문자열이 들어간 것만")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", type=Path, help="결과를 JSON 기준선으로 저장")
+    parser.add_argument("--compare", type=Path, help="JSON 기준선과 비교")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    # Streamlit 런타임 밖에서 실행 — 세션 없음 경고와 인구 인덱스 lexsort 경고는 측정과 무관
+    set_log_level("error")
+    warnings.simplefilter("ignore", pd.errors.PerformanceWarning)
+    result = run(args.scales, args.filter, args.seed)
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(result, ensure_ascii=False, indent=1), encoding="utf-8")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        rows = compare(result, baseline, args.threshold)
+        for scale, name, before, after, ratio, regressed in rows:
+            flag = "  ← 회귀" if regressed else ""
+            print(f"{int(scale):>10,}  {name:<28} {before:>10.2f}ms → {after:>10.2f}ms  ({ratio - 1:+.0%}){flag}")
+        regressions = sum(r[5] for r in rows)
+        print(f"회귀 {regressions}건 / 비교 {len(rows)}건 (임계 +{args.threshold:.0%})")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,142 @@
+import sys
+import threading
+import time
+from functools import wraps
+
+import pandas as pd
+import streamlit as st
+
+# 캐시 관측
+# st.cache_data / st.cache_resource를 감싸 함수별 호출·적중·미스 횟수, 엔트리별 메모리와 원천 조회 시각을 기록한다.
+# 캐시는 세션과 무관하게 프로세스 전역이므로 통계도 모듈 전역 레지스트리에 둔다.
+
+_registry = {}
+_lock = threading.Lock()
+
+
+def deep_size(obj):
+    """DataFrame/Series는 deep memory_usage, 튜플·리스트·딕셔너리는 구성 요소 합."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True, index=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True, index=True))
+    if isinstance(obj, (tuple, list)):
+        return sys.getsizeof(obj) + sum(deep_size(o) for o in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(deep_size(v) for v in obj.values())
+    return sys.getsizeof(obj)
+
+
+def _arg_key(args, kwargs):
+    return repr((args, sorted(kwargs.items())))
+
+
+def observed_cache(func=None, *, kind="data", depends_on=(), **cache_kwargs):
+    """@observed_cache 또는 @observed_cache(kind="resource", ttl=...) 형태로 사용.
+    depends_on: 결과를 만들 때 읽는 다른 관측 캐시 함수 이름 — 무효화가 이 관계를 따라 함께 번진다 (invalidate)."""
+    def decorator(func):
+        name = func.__name__
+        with _lock:
+            stats = _registry.setdefault(name, {
+                "name": name,
+                "kind": kind,
+                "calls": 0,
+                "misses": 0,
+                "entries": {},
+                "clear": None,
+                "depends_on": tuple(depends_on),
+            })
+
+        @wraps(func)
+        def compute(*args, **kwargs):
+            # 캐시 미스일 때만 실행된다
+            t0 = time.perf_counter()
+            result = func(*args, **kwargs)
+            with _lock:
+                stats["misses"] += 1
+                stats["entries"][_arg_key(args, kwargs)] = {
+                    "fetched_at": time.time(),
+                    "fetch_ms": (time.perf_counter() - t0) * 1000,
+                    "bytes": deep_size(result),
+                }
+            return result
+
+        cache = st.cache_resource if kind == "resource" else st.cache_data
+        cached = cache(compute, **cache_kwargs)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _lock:
+                stats["calls"] += 1
+            return cached(*args, **kwargs)
+
+        def clear(*args, **kwargs):
+            """인자를 주면 해당 엔트리만, 없으면 함수의 모든 엔트리를 무효화."""
+            cached.clear(*args, **kwargs)
+            with _lock:
+                if args or kwargs:
+                    stats["entries"].pop(_arg_key(args, kwargs), None)
+                else:
+                    stats["entries"].clear()
+
+        wrapper.clear = clear
+        stats["clear"] = clear
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
+
+
+def cache_report():
+    """캐시 함수별 현황 표 (관리 페이지용)."""
+    now = time.time()
+    rows = []
+    with _lock:
+        for stats in _registry.values():
+            entries = list(stats["entries"].values())
+            last_fetch = max((e["fetched_at"] for e in entries), default=None)
+            oldest = min((e["fetched_at"] for e in entries), default=None)
+            rows.append({
+                "함수": stats["name"],
+                "종류": stats["kind"],
+                "호출": stats["calls"],
+                "적중": stats["calls"] - stats["misses"],
+                "미스": stats["misses"],
+                "적중률": (stats["calls"] - stats["misses"]) / stats["calls"] if stats["calls"] else 0.0,
+                "엔트리 수": len(entries),
+                "메모리(MB)": sum(e["bytes"] for e in entries) / 1024 ** 2,
+                "최고령 엔트리(분)": (now - oldest) / 60 if oldest else None,
+                "마지막 원천 조회": pd.Timestamp(last_fetch, unit="s", tz="Asia/Seoul") if last_fetch else None,
+                "마지막 조회 소요(ms)": max(entries, key=lambda e: e["fetched_at"])["fetch_ms"] if entries else None,
+            })
+    return pd.DataFrame(rows)
+
+
+def _related(name):
+    """name을 원천부터 다시 만들 때 함께 비워야 하는 함수 이름 — name이 읽는 함수들(위로)과
+    그 함수들을 읽는 함수들(아래로). 파생 캐시만 비우면 낡은 입력에서 다시 만들어진다."""
+    depends = {s["name"]: s["depends_on"] for s in _registry.values()}
+    names, stack = set(), [name]
+    while stack:
+        current = stack.pop()
+        if current not in names:
+            names.add(current)
+            stack.extend(depends.get(current, ()))
+    stack = list(names)
+    while stack:
+        current = stack.pop()
+        for other, deps in depends.items():
+            if current in deps and other not in names:
+                names.add(other)
+                stack.append(other)
+    return names
+
+
+def invalidate(name=None):
+    """name 함수와 의존 관계로 엮인 캐시를, name이 없으면 등록된 모든 캐시를 무효화. 비운 함수 이름 목록을 반환."""
+    with _lock:
+        names = None if name is None else _related(name)
+        targets = [s for s in _registry.values() if names is None or s["name"] in names]
+    for stats in targets:
+        if stats["clear"] is not None:
+            stats["clear"]()
+    return sorted(s["name"] for s in targets)
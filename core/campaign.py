@@ -0,0 +1,423 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+# 마케팅성과분석 페이지 계산 — 캠페인 기간·비교 기간·타겟 행정동 → KPI, 순수 효과, 트렌드, 지역별 성과, 재방문
+
+PHASES = ['캠페인 전', '캠페인 중', '캠페인 후']
+COMPARISON_OPTIONS = ["이전 동일 기간", "전년 동기", "사용자 지정"]
+DEFAULT_TARGETS = ['월곶동', '배곧1동', '배곧2동']
+BOOTSTRAP_SAMPLES = 2000
+CONFIDENCE = 0.95
+REVISIT_DAYS = (7, 30, 90)
+BASELINE_TRAIN_DAYS = 730   # 기준선 학습 기간 (캠페인 시작 전)
+BASELINE_MIN_DAYS = 56      # 이보다 이력이 짧으면 기준선을 만들지 않는다
+
+
+def default_settings(dong_options, today, targets=None):
+    """캠페인 설정 기본값 — 최근 30일 캠페인, 이전 동일 기간 비교, 타겟 행정동(targets가 없으면 DEFAULT_TARGETS)."""
+    return {
+        "campaign_start": today - timedelta(days=30),
+        "campaign_end": today - timedelta(days=1),
+        "comparison_option": "이전 동일 기간",
+        "custom_before_start": today,
+        "custom_before_end": today,
+        "target_regions": [d for d in (targets or DEFAULT_TARGETS) if d in dong_options],
+    }
+
+
+def comparison_period(settings):
+    """비교 기준에 따른 (비교 시작일, 비교 종료일)."""
+    campaign_start, campaign_end = settings["campaign_start"], settings["campaign_end"]
+    campaign_days = (campaign_end - campaign_start).days + 1
+    if settings["comparison_option"] == "이전 동일 기간":
+        before_end = campaign_start - timedelta(days=1)
+        return before_end - timedelta(days=campaign_days-1), before_end
+    if settings["comparison_option"] == "전년 동기":
+        return campaign_start - timedelta(days=365), campaign_end - timedelta(days=365)
+    return settings["custom_before_start"], settings["custom_before_end"]
+
+
+def campaign_params(settings):
+    """결과 캐시 키로 쓰는 캠페인 조건 (페이지와 선계산이 같은 키를 만들도록 한 곳에서 정의)."""
+    before_start, before_end = comparison_period(settings)
+    return {
+        "campaign_start": settings["campaign_start"], "campaign_end": settings["campaign_end"],
+        "before_start": before_start, "before_end": before_end,
+        "target_regions": settings["target_regions"],
+    }
+
+
+def period_rows(df, start, end):
+    return df[(df['진료일자'] >= pd.to_datetime(start)) & (df['진료일자'] <= pd.to_datetime(end))]
+
+
+def campaign_windows(campaign_start, campaign_end, before_start, before_end):
+    """캠페인 분석이 읽는 모든 기간 — 캠페인 전후 30일(트렌드·재방문 포함)과 비교 기간 및 그 후 30일."""
+    return [
+        (campaign_start - timedelta(days=30), campaign_end + timedelta(days=30)),
+        (before_start, before_end + timedelta(days=30)),
+    ]
+
+
+def campaign_periods(df, campaign_start, campaign_end, before_start, before_end):
+    """캠페인 기간, 비교 기간, 캠페인 후 30일 진료 기록."""
+    campaign_data = period_rows(df, campaign_start, campaign_end)
+    before_data = period_rows(df, before_start, before_end)
+    after_data = period_rows(df, campaign_end + timedelta(days=1), campaign_end + timedelta(days=30))
+    return campaign_data, before_data, after_data
+
+
+def has_dong(data):
+    return data['행정동'].str.strip().astype(bool)
+
+
+def split_target(data, target_regions):
+    """(타겟, 비타겟) — 타겟이 없으면 전체가 타겟이고 비타겟은 빈 프레임."""
+    if not target_regions:
+        return data, pd.DataFrame()
+    in_target = data['행정동'].isin(target_regions)
+    return data[in_target], data[~in_target]
+
+
+def completeness(campaign_data):
+    """캠페인 기간 진료 건 중 행정동이 입력된 비율(%)과 미입력 건수."""
+    campaign_total = len(campaign_data)
+    campaign_missing = campaign_data['행정동'].isna() | ~has_dong(campaign_data)
+    missing_count = int(campaign_missing.sum())
+    rate = (1 - missing_count / campaign_total) * 100 if campaign_total > 0 else 0
+    return {"completeness": rate, "missing_count": missing_count, "total": campaign_total}
+
+
+def new_patient_count(data):
+    if len(data) == 0:
+        return 0
+    return data[data['초/재진'] == '신환']['환자번호'].nunique()
+
+
+def growth(curr, prev):
+    return ((curr - prev) / prev * 100) if prev > 0 else 0
+
+
+def campaign_kpis(campaign_target, before_target):
+    new_patients_campaign = new_patient_count(campaign_target)
+    new_patients_before = new_patient_count(before_target)
+
+    unique_patients_campaign = campaign_target['환자번호'].nunique()
+    unique_patients_before = before_target['환자번호'].nunique()
+
+    new_ratio_campaign = (new_patients_campaign / unique_patients_campaign * 100) if unique_patients_campaign > 0 else 0
+    new_ratio_before = (new_patients_before / unique_patients_before * 100) if unique_patients_before > 0 else 0
+
+    total_visits_campaign = len(campaign_target)
+    total_visits_before = len(before_target)
+    visits_per_patient_campaign = total_visits_campaign / unique_patients_campaign if unique_patients_campaign > 0 else 0
+    visits_per_patient_before = total_visits_before / unique_patients_before if unique_patients_before > 0 else 0
+
+    return {
+        "new_patients_campaign": new_patients_campaign,
+        "new_patients_before": new_patients_before,
+        "new_patient_growth": growth(new_patients_campaign, new_patients_before),
+        "unique_patients_campaign": unique_patients_campaign,
+        "unique_patients_before": unique_patients_before,
+        "patient_growth": growth(unique_patients_campaign, unique_patients_before),
+        "new_ratio_campaign": new_ratio_campaign,
+        "new_ratio_before": new_ratio_before,
+        "new_ratio_change": new_ratio_campaign - new_ratio_before,
+        "visits_per_patient_campaign": visits_per_patient_campaign,
+        "visits_per_patient_before": visits_per_patient_before,
+        "visits_per_patient_change": visits_per_patient_campaign - visits_per_patient_before,
+        "rows": len(campaign_target),
+    }
+
+
+def new_patient_lift(campaign_target, before_target, campaign_non_target, before_non_target):
+    """타겟 신환 성장률 - 비타겟(자연 성장) 신환 성장률. 비교할 비타겟 진료가 없으면 None."""
+    if len(campaign_non_target) == 0 or len(before_non_target) == 0:
+        return None
+    target_new_campaign = new_patient_count(campaign_target)
+    target_new_before = new_patient_count(before_target)
+    non_target_new_campaign = new_patient_count(campaign_non_target)
+    non_target_new_before = new_patient_count(before_non_target)
+
+    target_new_growth = growth(target_new_campaign, target_new_before)
+    non_target_new_growth = growth(non_target_new_campaign, non_target_new_before)
+    return {
+        "target_new_campaign": target_new_campaign,
+        "target_new_before": target_new_before,
+        "target_new_diff": target_new_campaign - target_new_before,
+        "target_new_growth": target_new_growth,
+        "non_target_new_campaign": non_target_new_campaign,
+        "non_target_new_before": non_target_new_before,
+        "non_target_new_diff": non_target_new_campaign - non_target_new_before,
+        "non_target_new_growth": non_target_new_growth,
+        "new_lift": target_new_growth - non_target_new_growth,
+    }
+
+
+def _growth_array(curr, prev):
+    # growth()의 배열 버전 — 비교 기간이 0이면 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(prev > 0, (curr - prev) / prev * 100, 0.0)
+
+
+def _interval(draws):
+    tail = (1 - CONFIDENCE) / 2 * 100
+    return np.percentile(draws, [tail, 100 - tail], axis=0)
+
+
+def lift_intervals(campaign_data, before_data, target_regions, samples=BOOTSTRAP_SAMPLES, seed=0):
+    """순수 효과(타겟·비타겟 신환 성장률과 그 차이)와 행정동별 신환_증가율의 부트스트랩 신뢰구간.
+    점추정과 같은 단위(타겟·비타겟은 그룹 안 고유 신환, 행정동별은 고유 (행정동, 환자) 쌍)를 포아송 부트스트랩으로
+    다시 뽑는다 — 환자마다 Poisson(1) 가중치를 주는 것과 같아서 n명의 합은 Poisson(n) 한 번으로 뽑힌다.
+    그룹·기간마다 따로 뽑으므로 전체 신환 수가 고정되지 않고, 타겟 비중이 커도 두 그룹 성장률이 서로 묶이지 않는다.
+    같은 조건이면 같은 구간이 나오도록 seed를 고정한다."""
+    rng = np.random.default_rng(seed)
+    new = [d.loc[d['초/재진'] == '신환', ['환자번호', '행정동']] for d in (campaign_data, before_data)]
+
+    # 타겟/비타겟 — new_patient_lift와 같이 split_target으로 나눈 뒤 그룹 안 고유 환자 수
+    groups = [[group['환자번호'].nunique() if len(group) else 0 for group in split_target(p, target_regions)] for p in new]
+    (target_campaign, non_target_campaign), (target_before, non_target_before) = (
+        [rng.poisson(n, size=samples) for n in period] for period in groups
+    )
+    target_growth = _growth_array(target_campaign, target_before)
+    non_target_growth = _growth_array(non_target_campaign, non_target_before)
+
+    # 행정동별 — region_performance와 같이 미입력 제외, (행정동, 환자) 쌍 단위
+    pairs = [p.drop_duplicates() for p in new]
+    dongs = pd.Index(pd.concat([p['행정동'] for p in pairs]).unique())
+    named = np.asarray(dongs.str.strip().astype(bool)) if len(dongs) else np.zeros(0, dtype=bool)
+    campaign_draws, before_draws = (
+        rng.poisson(np.bincount(dongs.get_indexer(p['행정동']), minlength=len(dongs))[named], size=(samples, int(named.sum())))
+        for p in pairs
+    )
+    low, high = _interval(_growth_array(campaign_draws, before_draws))
+    regions = pd.DataFrame({'행정동': dongs[named], '신환_증가율_하한': low, '신환_증가율_상한': high})
+
+    return {
+        "samples": samples,
+        "confidence": CONFIDENCE,
+        "target_new_growth": tuple(_interval(target_growth).tolist()),
+        "non_target_new_growth": tuple(_interval(non_target_growth).tolist()),
+        "new_lift": tuple(_interval(target_growth - non_target_growth).tolist()) if target_regions else None,
+        "regions": regions,
+    }
+
+
+def daily_new_trend(df, campaign_start, campaign_end, target_regions):
+    """캠페인 전후 30일 일별 신환 수, 7일 이동평균, 구간(전/중/후)별 일평균."""
+    trend_data = period_rows(df, campaign_start - timedelta(days=30), campaign_end + timedelta(days=30))
+    if target_regions:
+        trend_data = trend_data[trend_data['행정동'].isin(target_regions)]
+
+    # nunique 기반 일별 신환
+    daily_new = trend_data[trend_data['초/재진'] == '신환'].groupby('진료일자')['환자번호'].nunique().reset_index(name='신환수')
+    daily_new['7일 이동평균'] = daily_new['신환수'].rolling(window=7, min_periods=1).mean()
+
+    # Phase 분류 (전/중/후)
+    campaign_start_ts = pd.to_datetime(campaign_start)
+    campaign_end_ts = pd.to_datetime(campaign_end)
+    daily_new['구간'] = np.select(
+        [daily_new['진료일자'] < campaign_start_ts, daily_new['진료일자'] <= campaign_end_ts],
+        PHASES[:2],
+        PHASES[2],
+    )
+
+    # Phase별 일평균 + 평균선 구간
+    phase_df = (
+        daily_new.groupby('구간')
+        .agg(시작=('진료일자', 'min'), 종료=('진료일자', 'max'), 일평균=('신환수', 'mean'))
+        .reindex(PHASES)
+        .dropna()
+        .reset_index()
+    )
+    phase_avg = dict(zip(phase_df['구간'], phase_df['일평균']))
+    return daily_new, phase_df, phase_avg
+
+
+def daily_new_matrix(df):
+    """일자 × 행정동 신환 수 (한 환자는 하루 한 번, 신환이 없는 날은 0). 지역 조합별 기준선은 이 표의 열 합으로 만든다."""
+    new = df.loc[df['초/재진'] == '신환', ['진료일자', '환자번호', '행정동']].drop_duplicates(['진료일자', '환자번호'])
+    if len(new) == 0:
+        return pd.DataFrame()
+    days = new['진료일자'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    first = days.min()
+    codes, dongs = pd.factorize(new['행정동'])
+    n_days = days.max() - first + 1
+    counts = np.bincount((days - first) * len(dongs) + codes, minlength=n_days * len(dongs)).reshape(n_days, len(dongs))
+    index = pd.date_range(pd.Timestamp(int(first), unit='D'), periods=n_days, freq='D', name='진료일자')
+    return pd.DataFrame(counts, index=index, columns=pd.Index(dongs, dtype=object, name='행정동'))
+
+
+def _baseline_design(index, seasonal):
+    """상수·선형 추세·요일(월요일 기준)·(1년 이상 학습 시) 연간 계절 사인파 2개 주기."""
+    t = np.arange(len(index)) / 365.25
+    dow = index.dayofweek.to_numpy()
+    columns = [np.ones(len(index)), t] + [(dow == d).astype(float) for d in range(1, 7)]
+    if seasonal:
+        angle = 2 * np.pi * index.dayofyear.to_numpy() / 365.25
+        columns += [f(k * angle) for k in (1, 2) for f in (np.sin, np.cos)]
+    return np.column_stack(columns)
+
+
+def expected_baseline(matrix, campaign_start, campaign_end, target_regions, train_days=BASELINE_TRAIN_DAYS):
+    """캠페인 시작 전 이력으로 요일·계절·추세 기준선을 최소제곱으로 적합해, 캠페인 전후 30일의 기대 신환과 초과 신환.
+    이력이 짧으면 None."""
+    if matrix.empty:
+        return None
+    if target_regions:
+        matrix = matrix.loc[:, matrix.columns.isin(target_regions)]
+    actual = matrix.to_numpy().sum(axis=1)
+    index = matrix.index
+    start, end = pd.Timestamp(campaign_start), pd.Timestamp(campaign_end)
+
+    train = (index < start) & (index >= start - timedelta(days=train_days))
+    if train.sum() < BASELINE_MIN_DAYS:
+        return None
+    seasonal = train.sum() >= 365
+    design = _baseline_design(index, seasonal)
+    coef, *_ = np.linalg.lstsq(design[train], actual[train], rcond=None)
+    residual_std = float(np.std(actual[train] - design[train] @ coef))
+
+    window = (index >= start - timedelta(days=30)) & (index <= end + timedelta(days=30))
+    daily = pd.DataFrame({
+        '진료일자': index[window],
+        '실제신환': actual[window],
+        '기대신환': np.clip(design[window] @ coef, 0, None),
+    })
+    during = daily['진료일자'].between(start, end)
+    actual_sum, expected_sum = int(daily.loc[during, '실제신환'].sum()), float(daily.loc[during, '기대신환'].sum())
+    return {
+        "daily": daily,
+        "actual": actual_sum,
+        "expected": expected_sum,
+        "excess": actual_sum - expected_sum,
+        "excess_pct": growth(actual_sum, expected_sum),
+        # 일별 잔차가 독립이라 보고 캠페인 기간 합의 95% 범위
+        "excess_margin": 1.96 * residual_std * np.sqrt(int(during.sum())),
+        "train_days": int(train.sum()),
+        "seasonal": bool(seasonal),
+    }
+
+
+def region_performance(campaign_data, before_data, target_regions):
+    """행정동별 캠페인/비교 기간 환자수·신환수와 증가율·비중·순수 효과 — nunique 기반, 행정동 미입력 제외.
+    두 기간을 이어 붙여 (기간, 행정동, 환자, 신환 여부)로 중복을 한 번 걸러 낸 뒤 (기간, 행정동)별로 한 번에 센다.
+    행정동 입력 여부는 행마다가 아니라 고유 행정동 값에서 판정한다."""
+    stacked = pd.concat(
+        [d[['행정동', '환자번호']].assign(기간=period, 신환=d['초/재진'] == '신환')
+         for period, d in (('캠페인', campaign_data), ('이전', before_data))],
+        ignore_index=True,
+    )
+    codes, dongs = pd.factorize(stacked['행정동'])
+    named = np.append(pd.Index(dongs, dtype=object).str.strip().astype(bool), False)  # -1(결측) → 미입력
+    stacked = stacked[named[codes]].drop_duplicates(['기간', '행정동', '환자번호', '신환'])
+
+    counts = (
+        stacked.groupby(['행정동', '기간'])
+        .agg(환자수=('환자번호', 'nunique'), 신환수=('신환', 'sum'))
+        .unstack('기간', fill_value=0)
+    )
+    counts.columns = [f"{measure}_{period}" for measure, period in counts.columns]
+    region_perf = counts.reindex(columns=['환자수_캠페인', '신환수_캠페인', '환자수_이전', '신환수_이전'], fill_value=0).reset_index()
+    return region_rates(region_perf, target_regions)
+
+
+def region_rates(region_perf, target_regions):
+    """행정동별 환자수·신환수(캠페인/이전) → 증가·증가율·타겟여부·비중·순수 효과. 집계 엔진(pandas/DuckDB)과 무관한 마무리 단계."""
+    counts = ['환자수_캠페인', '신환수_캠페인', '환자수_이전', '신환수_이전']
+    region_perf = region_perf.astype({c: 'int64' for c in counts})
+
+    region_perf['신환_증가'] = region_perf['신환수_캠페인'] - region_perf['신환수_이전']
+    region_perf['신환_증가율'] = (region_perf['신환_증가'] / region_perf['신환수_이전'] * 100).replace([np.inf, -np.inf], 0).fillna(0)
+    region_perf['환자_증가율'] = ((region_perf['환자수_캠페인'] - region_perf['환자수_이전']) / region_perf['환자수_이전'] * 100).replace([np.inf, -np.inf], 0).fillna(0)
+
+    # 타겟 지역 표시
+    region_perf['타겟여부'] = region_perf['행정동'].isin(target_regions)
+
+    # 신환 비중(기간별 전체 행정동 신환 중 비율)과 순수 효과(비타겟 행정동 합계의 신환 증가율 대비, 타겟이 없으면 전체 대비)
+    for period in ['캠페인', '이전']:
+        total = region_perf[f'신환수_{period}'].sum()
+        region_perf[f'신환_비중_{period}'] = region_perf[f'신환수_{period}'] / total * 100 if total > 0 else 0.0
+    region_perf['신환_비중_변화'] = region_perf['신환_비중_캠페인'] - region_perf['신환_비중_이전']
+    baseline = region_perf[~region_perf['타겟여부']] if target_regions else region_perf
+    region_perf['신환_순수효과'] = region_perf['신환_증가율'] - growth(baseline['신환수_캠페인'].sum(), baseline['신환수_이전'].sum())
+    return region_perf
+
+
+def new_patient_rows(data, target_regions):
+    if target_regions:
+        return data[(data['초/재진'] == '신환') & (data['행정동'].isin(target_regions))]
+    return data[data['초/재진'] == '신환']
+
+
+def age_mix(new_patients_campaign_df, new_patients_before_df):
+    """연령대별 신환 구성비 (캠페인 vs 이전)."""
+    age_campaign = new_patients_campaign_df.drop_duplicates('환자번호').groupby('연령대', observed=True).size().reset_index(name='신환수')
+    age_before = new_patients_before_df.drop_duplicates('환자번호').groupby('연령대', observed=True).size().reset_index(name='신환수')
+
+    campaign_total_age = age_campaign['신환수'].sum()
+    before_total_age = age_before['신환수'].sum()
+    age_campaign['구성비'] = (age_campaign['신환수'] / campaign_total_age * 100) if campaign_total_age > 0 else 0
+    age_before['구성비'] = (age_before['신환수'] / before_total_age * 100) if before_total_age > 0 else 0
+    age_campaign['기간'] = '캠페인'
+    age_before['기간'] = '이전'
+    return age_campaign, age_before
+
+
+def gender_mix(new_patients_df):
+    """신환 성별 구성비(%)."""
+    return new_patients_df.drop_duplicates('환자번호')['성별'].replace({'M': '남성', 'F': '여성'}).value_counts(normalize=True) * 100
+
+
+def revisit_profile(data, patient_ids, day, window=30, days=REVISIT_DAYS):
+    """patient_ids 코호트의 day 이후 재방문 — ({N: N일 안 재방문율(%)}, window일 안 환자별 재방문 횟수).
+    data는 방문 순번 열이 붙은 진료 기록으로, 코호트의 day 이전 마지막 방문과 day 후 window일을 포함해야 한다."""
+    # 기준일부터 각 방문까지, 각 방문의 다음 방문까지 일수 (다음 방문이 없으면 NaN)
+    since = (data['진료일자'].to_numpy() - np.datetime64(pd.Timestamp(day))) / np.timedelta64(1, 'D')
+    wait = since + data['다음방문일수'].to_numpy()
+    # 다음 방문이 기준일(구간 끝) 뒤인 방문 = 환자별 기준일(구간 끝) 이전 마지막 방문
+    at_day = (since <= 0) & ~(wait <= 0)
+    at_end = (since <= window) & ~(wait <= window)
+    rows = np.flatnonzero(at_day | at_end)
+    rows = rows[data['환자번호'].iloc[rows].isin(patient_ids).to_numpy()]
+
+    base, end = rows[at_day[rows]], rows[~at_day[rows]]
+    n = len(patient_ids)
+    rates = {d: int((wait[base] <= d).sum()) / n * 100 if n > 0 else 0 for d in days}
+
+    # window일 안 재방문 횟수 = 구간 끝 이전 마지막 방문 순번 - 기준일 이전 마지막 방문 순번
+    # (재방문이 없는 환자는 두 행이 같아 end에 없다)
+    patients, ordinal = data['환자번호'], data['방문순번'].to_numpy()
+    base_ordinal = pd.Series(ordinal[base], index=patients.iloc[base].to_numpy())
+    revisit_count = pd.DataFrame({
+        '환자번호': patients.iloc[end].to_numpy(),
+        '재방문횟수': ordinal[end] - base_ordinal.reindex(patients.iloc[end].to_numpy()).to_numpy(),
+    }).sort_values('환자번호', ignore_index=True)
+    return rates, revisit_count
+
+
+def revisit_metrics(df, new_patient_ids, before_new_patient_ids, campaign_end, before_end):
+    """캠페인 신환과 비교 기간 신환의 종료 후 7·30·90일 재방문 (df는 두 기간과 각 종료 후 30일을 포함)."""
+    rates, revisit_count = revisit_profile(df, new_patient_ids, campaign_end)
+    before_rates, before_revisit_count = revisit_profile(df, before_new_patient_ids, before_end)
+
+    avg_revisits = revisit_count['재방문횟수'].mean() if len(revisit_count) > 0 else 0
+    before_avg_revisits = before_revisit_count['재방문횟수'].mean() if len(before_revisit_count) > 0 else 0
+
+    revisit_dist = revisit_count['재방문횟수'].value_counts().reset_index()
+    revisit_dist.columns = ['재방문횟수', '환자수']
+
+    return {
+        "revisit_rate": rates[30],
+        "before_revisit_rate": before_rates[30],
+        "avg_revisits": avg_revisits,
+        "before_avg_revisits": before_avg_revisits,
+        "retention_7d_rate": rates[7],
+        "before_7d_rate": before_rates[7],
+        "rates": rates,
+        "before_rates": before_rates,
+        "revisit_count": revisit_count,
+        "revisit_dist": revisit_dist,
+    }
@@ -0,0 +1,126 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# 월별 신환 코호트 재방문
+# 첫 방문이 신환인 환자를 첫 방문 월로 묶고(코호트), 이후 1~12개월째 달에 한 번이라도 내원한 환자 비율을 센다.
+# - 코호트별로 기간을 거르지 않고 (환자, 방문 월) 쌍을 한 번 중복 제거한 뒤 (코호트 월, 경과 월) bincount 한 번으로 센다.
+# - 칸 하나는 '방문 월'까지의 진료 기록으로 정해지므로, 데이터가 다시 로드되면 내용(환자번호·진료일자·초/재진)이
+#   달라진 첫 달부터만 다시 센다. 행 수가 같은 수정(신환↔재진 정정 등)도 월별 내용 요약값으로 잡는다.
+#   새 달이 붙는 평소에는 지난 달(진행 중이던 달)과 새 달만 센다.
+# 방문 순번 열(core.data.visit_sequence)이 붙은 진료 기록을 받는다.
+
+RETENTION_MONTHS = 12
+
+
+def _months(dates):
+    """1970-01부터 월 번호. 일 번호 → 월 번호 표를 한 번 만들어 찾는다 (datetime64[M] 변환보다 빠르다)."""
+    days = dates.to_numpy().astype('datetime64[D]').astype(np.int64)
+    lo = days.min()
+    table = np.arange(lo, days.max() + 1).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    return table[days - lo]
+
+
+def _month_digest(df, month):
+    """월별 (환자번호, 진료일자, 초/재진) 행 해시의 합 — 행 순서와 무관하고, 한 행만 바뀌어도 그 달 값이 달라진다.
+    문자열 열을 통째로 해시하지 않고 환자번호 해시와 (일 번호, 신환 여부) 해시를 섞는다 (집계 자체보다 싸게)."""
+    days = df['진료일자'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    new = (df['초/재진'] == '신환').to_numpy()
+    rows = pd.util.hash_array(df['환자번호'].to_numpy())
+    rows ^= pd.util.hash_array(days * 2 + new) * np.uint64(0x9E3779B97F4A7C15)
+    digest = np.zeros(int(month.max()) + 1, dtype=np.uint64)
+    np.add.at(digest, month, rows)
+    return digest
+
+
+class CohortRetention:
+    """(코호트 월 × 경과 월 0~months) 재방문 환자 수를 들고 있다가 바뀐 달부터만 다시 센다."""
+
+    def __init__(self, months=RETENTION_MONTHS):
+        self.months = months
+        self._lock = threading.Lock()
+        self._base = None                              # 첫 진료 월 (1970-01부터 월 번호)
+        self._digest = np.zeros(0, dtype=np.uint64)    # 월별 내용 요약값 (지난 갱신)
+        self._counts = np.zeros((0, months + 1), dtype=np.int64)
+
+    def _changed_from(self, base, digest):
+        """다시 세야 하는 첫 달 (첫 진료 월 기준 상대 번호)."""
+        if base != self._base:
+            return 0
+        same = min(len(digest), len(self._digest))
+        diff = np.flatnonzero(digest[:same] != self._digest[:same])
+        return int(diff[0]) if len(diff) else same
+
+    def _recount(self, df, month, start, n):
+        width = self.months + 1
+        counts = np.zeros((n, width), dtype=np.int64)
+        keep = min(n, len(self._counts))
+        counts[:keep] = self._counts[:keep]
+        # start 이후 방문 월에 해당하는 칸은 비우고 다시 센다
+        visit = np.arange(n)[:, None] + np.arange(width)[None, :]
+        counts[visit >= start] = 0
+
+        # 코호트 — 첫 방문(방문순번 1)이 신환인 환자의 첫 방문 월
+        first = np.flatnonzero(df['방문순번'].to_numpy() == 1)
+        first = first[(df['초/재진'].iloc[first] == '신환').to_numpy()]
+        cohort_ids = pd.Index(df['환자번호'].iloc[first])
+        cohort_month = month[first]
+
+        tail = month >= start
+        patient = cohort_ids.get_indexer(df['환자번호'][tail])
+        visit_month = month[tail]
+        known = patient >= 0
+        patient, visit_month = patient[known], visit_month[known]
+
+        # (환자, 방문 월) 중복 제거 → (코호트 월, 경과 월) 한 번에 집계
+        # (np.unique의 해시 방식보다 정렬 후 인접 비교가 빠르다)
+        pairs = np.sort(patient.astype(np.int64) * n + visit_month)
+        pairs = pairs[np.append(True, pairs[1:] != pairs[:-1])] if len(pairs) else pairs
+        patient, visit_month = pairs // n, pairs % n
+        cohort = cohort_month[patient]
+        offset = visit_month - cohort
+        inside = (offset >= 0) & (offset <= self.months)
+        counts += np.bincount(
+            cohort[inside] * width + offset[inside], minlength=n * width
+        ).reshape(n, width)
+        self._counts = counts
+
+    def update(self, df):
+        """df(전체 진료 기록)로 갱신한 코호트 표."""
+        with self._lock:
+            if len(df) == 0:
+                self._base, self._digest = None, np.zeros(0, dtype=np.uint64)
+                self._counts = np.zeros((0, self.months + 1), dtype=np.int64)
+                return self._frame()
+            month = _months(df['진료일자'])
+            base = int(month.min())
+            month = month - base
+            digest = _month_digest(df, month)
+            start = self._changed_from(base, digest)
+            if start < len(digest) or len(digest) != len(self._digest):
+                self._recount(df, month, start, len(digest))
+            self._base, self._digest = base, digest
+            return self._frame()
+
+    def _frame(self):
+        """코호트 월 · 신환 수 · 1~months개월째 재방문율(%). 아직 오지 않은 달은 NaN."""
+        n, width = len(self._digest), self.months + 1
+        if n == 0:
+            return pd.DataFrame(columns=['코호트', '신환수', *range(1, width)])
+        size = self._counts[:, 0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rate = self._counts / size[:, None] * 100
+        rate[(np.arange(n)[:, None] + np.arange(width)[None, :]) >= n] = np.nan
+        labels = (np.datetime64(self._base, 'M') + np.arange(n)).astype(str)
+        frame = pd.DataFrame(rate[:, 1:], columns=range(1, width))
+        frame.insert(0, '신환수', size)
+        frame.insert(0, '코호트', labels)
+        return frame[frame['신환수'] > 0].reset_index(drop=True)
+
+
+# 프로세스당 하나 — 데이터가 다시 로드돼도 지난 집계를 이어서 쓴다
+@st.cache_resource
+def cohort_retention():
+    return CohortRetention()
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+
+# 기간 비교 엔진
+# 조회 기간(period 0)과 과거 비교 기간(period 1..N)을 행 태깅 한 번 + 그룹 집계 한 번으로 계산한다.
+# 비교 기간이 늘어나도 원본 필터링은 다시 하지 않으므로 3~5년 비교도 1년 비교와 비용이 거의 같다.
+
+CURRENT_LABEL = "조회 기간"
+PERIOD_COLORS = ['#FFDC3C', '#A0AEC0', '#4BA3C7', '#00C49A', '#FF8C42', '#9B59B6']
+
+
+def year_offsets(n):
+    return [pd.DateOffset(years=k) for k in range(1, n + 1)]
+
+
+def offset_label(offset):
+    kwds = offset.kwds
+    if set(kwds) == {"years"}:
+        return "전년 동기" if kwds["years"] == 1 else f"{kwds['years']}년 전 동기"
+    if set(kwds) == {"months"}:
+        return f"{kwds['months']}개월 전"
+    if set(kwds) == {"days"}:
+        return f"{kwds['days']}일 전"
+    return f"{offset} 전"
+
+
+def period_bounds(start, end, offsets):
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    bounds = [(start, end)]
+    bounds += [(start - off, end - off) for off in offsets]
+    return bounds
+
+
+def tag_periods(dates, start, end, offsets):
+    """각 기간에 속하는 (행 위치, 기간 번호) 쌍. 기간이 겹치면 한 행이 여러 기간에 속할 수 있다."""
+    values = dates.to_numpy()
+    rows, periods = [], []
+    for p, (lo, hi) in enumerate(period_bounds(start, end, offsets)):
+        idx = np.flatnonzero((values >= lo.to_datetime64()) & (values <= hi.to_datetime64()))
+        rows.append(idx)
+        periods.append(np.full(len(idx), p, dtype=np.int16))
+    return np.concatenate(rows), np.concatenate(periods)
+
+
+def compare_periods(df, start, end, offsets):
+    """조회 기간과 offsets 만큼 이전 기간들의 일별 추이와 기간별 KPI.
+
+    daily: period, 기간, 진료일자, plot_date(조회 기간 달력에 맞춘 날짜), 진료횟수
+    kpis:  period 인덱스, 기간, 진료횟수/환자수/신환수/신환비율/인당진료횟수와 조회 기간 대비 증감
+    """
+    rows, periods = tag_periods(df['진료일자'], start, end, offsets)
+
+    tagged = pd.DataFrame({
+        'period': periods,
+        '진료일자': df['진료일자'].to_numpy()[rows],
+        '환자번호': df['환자번호'].to_numpy()[rows],
+    })
+    # 신환만 남긴 환자번호 — nunique가 NaN을 무시하므로 신환수도 같은 groupby에서 집계된다
+    tagged['신환번호'] = tagged['환자번호'].where(df['초/재진'].to_numpy()[rows] == "신환")
+
+    counts = tagged.groupby('period').agg(
+        진료횟수=('환자번호', 'size'),
+        환자수=('환자번호', 'nunique'),
+        신환수=('신환번호', 'nunique'),
+    )
+    daily = (
+        tagged.groupby(['period', '진료일자']).size()
+        .reset_index(name='진료횟수')
+    )
+    return comparison_frames(counts, daily, offsets)
+
+
+def comparison_frames(counts, daily, offsets):
+    """기간별 집계(counts: period 인덱스, 진료횟수/환자수/신환수)와 기간·일별 진료횟수(daily)
+    → compare_periods의 (daily, kpis). 집계 엔진(pandas/DuckDB)과 무관한 마무리 단계."""
+    labels = [CURRENT_LABEL] + [offset_label(off) for off in offsets]
+    kpis = counts.reindex(range(len(labels)), fill_value=0)
+    kpis.insert(0, '기간', labels)
+    patients = kpis['환자수'].where(kpis['환자수'] > 0)
+    kpis['신환비율'] = (kpis['신환수'] / patients).fillna(0)
+    kpis['인당진료횟수'] = (kpis['진료횟수'] / patients).fillna(0)
+
+    current = kpis.loc[0]
+    for col in ['진료횟수', '환자수', '인당진료횟수']:
+        base = kpis[col].where(kpis[col] > 0)
+        kpis[f'{col}_증감률'] = ((current[col] - base) / base * 100).fillna(0)
+    kpis['신환비율_증감'] = (current['신환비율'] - kpis['신환비율']) * 100  # %p
+
+    daily['plot_date'] = daily['진료일자']
+    for p, off in enumerate(offsets, start=1):
+        sel = daily['period'] == p
+        daily.loc[sel, 'plot_date'] = daily.loc[sel, '진료일자'] + off
+    daily['기간'] = daily['period'].map(dict(enumerate(labels)))
+    return daily.sort_values(['period', '진료일자']).reset_index(drop=True), kpis
+
+
+def monthly_growth(daily, period=1):
+    """조회 기간 월별 진료횟수와 period 기간(달력 정렬) 대비 성장률."""
+    monthly = (
+        daily[daily['period'].isin([0, period])]
+        .groupby(['period', pd.Grouper(key='plot_date', freq='ME')])['진료횟수'].sum()
+        .unstack('period')
+        .reindex(columns=[0, period])
+    )
+    monthly = monthly[monthly[0].notna()]
+    monthly = pd.DataFrame({
+        '진료일자': monthly.index,
+        '진료횟수': monthly[0].astype(int).to_numpy(),
+        'ly_진료횟수': monthly[period].to_numpy(),
+    })
+    monthly['성장률'] = (monthly['진료횟수'] - monthly['ly_진료횟수']) / monthly['ly_진료횟수']
+    monthly['ly_진료횟수'] = monthly['ly_진료횟수'].fillna(0).astype(int)
+    return monthly
+
+
+SEGMENT_COLUMNS = ['연령대', '성별', '시/도', '시/군/구']
+SEGMENT_KPIS = ['진료횟수', '환자수', '신환비율', '인당진료횟수']
+
+
+def segment_kpis(df, start, end, by=SEGMENT_COLUMNS):
+    """by 세그먼트(기본: 연령대 × 성별 × 시/군/구)별 조회 기간 KPI와 전년 동기 대비 증감.
+
+    두 기간을 행 태깅으로 이어 붙여 (세그먼트, 기간) 그룹 집계 한 번으로 센다.
+    전년 동기에 기록이 없던 세그먼트의 증감률은 NaN.
+    """
+    rows, periods = tag_periods(df['진료일자'], start, end, year_offsets(1))
+    # 세그먼트 열은 dtype(범주·Arrow 문자열)을 유지한 채 행만 고른다 — object 배열로 바꾸는 비용이 집계보다 크다
+    tagged = df[by].take(rows).reset_index(drop=True)
+    tagged['period'] = periods
+    tagged['환자번호'] = df['환자번호'].to_numpy()[rows]
+    tagged['신환번호'] = tagged['환자번호'].where((df['초/재진'] == "신환").to_numpy()[rows])
+
+    counts = (
+        tagged.groupby([*by, 'period'], observed=True, sort=False).agg(
+            진료횟수=('환자번호', 'size'),
+            환자수=('환자번호', 'nunique'),
+            신환수=('신환번호', 'nunique'),
+        )
+        .unstack('period', fill_value=0)
+        .reindex(columns=pd.MultiIndex.from_product([['진료횟수', '환자수', '신환수'], [0, 1]]), fill_value=0)
+    )
+    current, prior = counts.xs(0, axis=1, level=1), counts.xs(1, axis=1, level=1)
+    # 조회 기간에 기록이 있는 세그먼트만 남긴다
+    seen = (current['진료횟수'] > 0).to_numpy()
+    current, prior = current[seen], prior[seen]
+
+    def ratios(counts):
+        patients = counts['환자수'].where(counts['환자수'] > 0)
+        return counts.assign(신환비율=counts['신환수'] / patients, 인당진료횟수=counts['진료횟수'] / patients)
+
+    current, prior = ratios(current), ratios(prior)
+    kpis = current[SEGMENT_KPIS].copy()
+    for col in ['진료횟수', '환자수', '인당진료횟수']:
+        base = prior[col].where(prior[col] > 0)
+        kpis[f'{col}_증감률'] = (current[col] - base) / base * 100
+    kpis['신환비율_증감'] = (current['신환비율'] - prior['신환비율']) * 100  # %p
+    kpis['전년_진료횟수'] = prior['진료횟수']
+    return kpis.reset_index().sort_values('진료횟수', ascending=False, ignore_index=True)
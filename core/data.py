@@ -0,0 +1,220 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from core.cache_stats import observed_cache
+from core.partitions import visit_store
+from core.sources import POPULATION, VISITS, data_source
+
+# 공용 데이터 로더 (Google Sheets via API, 또는 core/sources.py의 로컬 원천)
+# 모든 페이지가 같은 캐시 엔트리를 공유하고, 관리 페이지에서 함수별로 관측·무효화할 수 있도록 한 곳에 모아 둔다.
+# 큰 기반 테이블은 cache_resource로 프로세스당 한 번만 만들고 읽기 전용 버퍼로 고정해(freeze) 모든 세션이 같은 객체를 공유한다.
+# 페이지는 공유 프레임을 수정하지 말고 필터링·assign으로 파생 프레임을 만들어 쓴다.
+# 원천(인증된 Sheets 클라이언트 등)은 프로세스당 하나를 모든 조회가 재사용하고, 여러 시트가 필요한 페이지는 load_all로 동시에 읽는다.
+
+if int(pd.__version__.split(".")[0]) < 3:
+    # pandas 3부터는 기본값 — 파생 프레임이 공유 프레임의 버퍼를 복사 없이 참조하도록
+    pd.set_option("mode.copy_on_write", True)
+
+province_map = {
+    '서울': '서울특별시', '인천': '인천광역시', '경기': '경기도', '광주': '광주광역시',
+    '부산': '부산광역시', '대구': '대구광역시', '대전': '대전광역시', '울산': '울산광역시',
+    '경남': '경상남도', '경북': '경상북도', '전남': '전라남도', '충북': '충청북도', '충남': '충청남도'
+}
+
+special_cities = {
+    "수원시","성남시","안양시","부천시","안산시",
+    "고양시","용인시","청주시","천안시",
+    "전주시","포항시","창원시"
+}
+
+
+def split_address(addr: str):
+    parts = addr.split()
+    if parts[0]=="세종특별자치시" and len(parts)==2:
+        return pd.Series({"시/도":parts[0],"시/군/구":"","행정동":parts[1]})
+    elif len(parts)==4 and parts[1] in special_cities:
+        return pd.Series({
+            "시/도":parts[0],
+            "시/군/구":f"{parts[1]} {parts[2]}",
+            "행정동":parts[3]
+        })
+    elif len(parts)==3 and parts[1] not in special_cities:
+        return pd.Series({
+            "시/도":parts[0],
+            "시/군/구":parts[1],
+            "행정동":parts[2]
+        })
+    else:
+        return pd.Series({"시/도":None,"시/군/구":None,"행정동":None})
+
+
+AGE_BINS = list(range(0, 101, 10)) + [999]
+AGE_LABELS = ["9세이하"] + [f"{i}대" for i in range(10, 100, 10)] + ["100세이상"]
+
+
+def categorize_time(hms):
+    if pd.isna(hms):
+        time_str = '000000'
+    else:
+        try:
+            val = int(hms)
+            time_str = str(val).zfill(6)
+        except:
+            time_str = str(hms).zfill(6)
+    hour = int(time_str[:2])
+    return f"{hour:02d}"
+
+
+def freeze(df):
+    """열 버퍼를 읽기 전용으로 고정한 DataFrame. 공유 프레임에 값을 쓰려 하면 ValueError가 난다."""
+    columns = {}
+    for col in df.columns:
+        values = df[col].array
+        if isinstance(values, pd.Categorical):
+            codes = values.codes.copy()
+            codes.setflags(write=False)
+            columns[col] = pd.Categorical.from_codes(codes, dtype=values.dtype)
+        elif isinstance(df[col].dtype, np.dtype):
+            arr = df[col].to_numpy(copy=True)
+            arr.setflags(write=False)
+            columns[col] = arr
+        else:
+            # Arrow 문자열 등 확장 배열은 그대로 (Arrow 버퍼는 원래 불변)
+            columns[col] = values
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+def stamp(df):
+    # 결과 캐시가 원본 교체를 감지할 수 있도록 로드 시각 기반 스냅샷 버전을 남긴다
+    df.attrs["snapshot"] = f"{time.time_ns():x}"
+    return df
+
+
+FETCH_WORKERS = 4
+
+
+def _fetch_records(table):
+    return data_source().read(table)
+
+
+def load_all(*loaders):
+    """여러 로더를 동시에 실행해 결과를 인자 순서대로 반환.
+    콜드 로드 시간이 시트별 조회 시간의 합이 아니라 가장 느린 한 시트에 가까워진다. 캐시된 로더는 바로 반환된다."""
+    if len(loaders) <= 1:
+        return tuple(loader() for loader in loaders)
+    ctx = get_script_run_ctx(suppress_warning=True)
+
+    def run(loader):
+        # 호출한 세션의 실행 컨텍스트를 붙여 캐시 함수가 세션 밖 호출 경고를 내지 않게 한다
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return loader()
+
+    with ThreadPoolExecutor(max_workers=min(len(loaders), FETCH_WORKERS), thread_name_prefix="sheets") as pool:
+        futures = [pool.submit(run, loader) for loader in loaders]
+        return tuple(f.result() for f in futures)
+
+
+def prepare_visits(df):
+    df['진료일자'] = pd.to_datetime(df['진료일자'], format='%Y%m%d')
+    df['진료시간대'] = df['진료시간'].apply(categorize_time)
+    df['연령대'] = pd.cut(df['나이'], bins=AGE_BINS, labels=AGE_LABELS, right=False, include_lowest=True)
+    return df
+
+
+def visit_sequence(visits):
+    """환자별 방문 순번(1부터)과 다음 방문까지 일수(마지막 방문은 NaN) 열을 붙인 프레임.
+    환자번호·진료일자로 한 번 정렬해 차분한다 — 재방문율·재방문 횟수는 코호트마다 기간을 다시 훑지 않고 이 두 열로 계산한다."""
+    codes = pd.factorize(visits['환자번호'])[0]
+    days = visits['진료일자'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    order = np.lexsort((days, codes))
+    patient, day = codes[order], days[order]
+    n = len(order)
+
+    same_next = np.zeros(n, dtype=bool)
+    same_next[:-1] = patient[1:] == patient[:-1]
+    first = np.ones(n, dtype=bool)
+    first[1:] = ~same_next[:-1]
+    position = np.arange(n)
+    gap = np.full(n, np.nan, dtype=np.float32)
+    gap[:-1] = np.where(same_next[:-1], np.diff(day), np.nan)
+
+    ordinal = np.empty(n, dtype=np.int32)
+    ordinal[order] = position - np.maximum.accumulate(np.where(first, position, 0)) + 1
+    next_gap = np.empty(n, dtype=np.float32)
+    next_gap[order] = gap
+    return visits.assign(방문순번=ordinal, 다음방문일수=next_gap)
+
+
+# 진료 기록 (Sheet1) — 날짜 파싱, 진료시간대, 연령대, 방문 순번까지 전처리한 공유 프레임
+# 파티션 저장소가 설정되어 있으면 월별 파티션으로 동기화한 뒤 메모리 맵 프레임을 공유한다 (core/partitions.py)
+@observed_cache(kind="resource")
+def load_visits():
+    df = prepare_visits(_fetch_records(VISITS))
+    store = visit_store()
+    if store is not None:
+        store.sync(df)
+        df = store.load()
+    # 방문 순번·다음 방문 간격은 전체 이력에서 파생 — 환자가 다시 오면 지난 달 값도 바뀌므로 파티션 파일에는 쓰지 않는다
+    return stamp(freeze(visit_sequence(df)))
+
+
+def visits_for(bounds):
+    """bounds [(시작, 끝), ...] 중 하나에 속하는 진료 기록. 결과 행 순서는 공유 프레임을 기간으로 거른 것과 같다.
+    파티션을 따로 읽지 않고 공유 프레임을 거른다 — 방문 순번 열과 진료 기록이 항상 같은 스냅샷에서 나온다."""
+    frame = load_visits()
+    dates = frame['진료일자']
+    mask = np.zeros(len(frame), dtype=bool)
+    for lo, hi in bounds:
+        mask |= ((dates >= pd.Timestamp(lo)) & (dates <= pd.Timestamp(hi))).to_numpy()
+    return frame[mask]
+
+
+def prepare_population(pop):
+    split_df = pop["행정기관"].apply(split_address)
+    split_df.columns = ["시/도","시/군/구","행정동"]
+
+    df = pd.concat([pop, split_df], axis=1).dropna(subset=["시/도"])
+
+    if "총 인구수" in df.columns:
+        df = df.rename(columns={"총 인구수":"전체인구"})
+    return df.set_index(["시/도","시/군/구","행정동"])
+
+
+def patient_table(visits):
+    """환자별 마지막 내원 기록과 행정동 매칭률 (df, acc)."""
+    df = visits.sort_values("진료일자", kind="stable").drop_duplicates("환자번호", keep="last")
+
+    acc = len(df[df["행정동"]!=""]) / len(df)
+
+    province = df["시/도"].map(province_map).fillna(df["시/도"])
+    df = df.assign(
+        **{
+            "시/도": province,
+            "행정기관": np.where(
+                province=="세종특별자치시",
+                province+" "+df["행정동"],
+                province+" "+df["시/군/구"]+" "+df["행정동"]
+            ),
+        }
+    )
+    return df, acc
+
+
+# 행정기관을 시/도·시/군/구·행정동으로 분해한 인구 테이블
+@observed_cache(kind="resource")
+def load_population():
+    return stamp(freeze(prepare_population(_fetch_records(POPULATION))))
+
+
+# 환자별 마지막 내원 기록 + 행정동 매칭률 — 시트를 다시 읽지 않고 공유 진료 기록에서 만든다
+# (load_visits를 무효화하면 함께 비워진다)
+@observed_cache(kind="resource", depends_on=("load_visits",))
+def load_patient_data():
+    df, acc = patient_table(load_visits())
+    return stamp(freeze(df)), acc
@@ -0,0 +1,105 @@
+import os
+
+import pandas as pd
+import streamlit as st
+
+from core.campaign import region_rates
+from core.comparison import comparison_frames, period_bounds
+from core.sources import setting
+
+try:
+    import duckdb
+except ImportError:  # 선택 의존성 — 없으면 pandas 엔진만 쓴다
+    duckdb = None
+
+# DuckDB 분석 엔진 (선택)
+# 진료 기록 스냅샷을 내장 DuckDB의 컬럼형 테이블로 한 번 적재해 두고, 기간 비교·지역별 성과처럼
+# 기간·지역별 고유 환자수(distinct count)를 세는 집계를 SQL 한 번으로 실행한다 (멀티스레드 벡터 실행).
+# 페이지는 중간 프레임(세그먼트·기간별 필터 결과)을 만들지 않고 작은 집계 결과만 받는다.
+# 결과 형태는 pandas 엔진과 같으며 마무리 계산(증감률 등)은 같은 함수를 쓴다.
+# 사용: pip install duckdb 후 DASHBOARD_ENGINE=duckdb 또는 secrets [data_source] engine = "duckdb".
+
+THREADS = os.cpu_count() or 1
+
+
+def enabled():
+    return duckdb is not None and setting("DASHBOARD_ENGINE", "engine", "pandas") == "duckdb"
+
+
+# 스냅샷 버전별 데이터베이스 — 원본이 다시 로드되면 새 버전으로 다시 적재된다 (이전 버전은 max_entries로 정리)
+@st.cache_resource(max_entries=2)
+def _database(snapshot, _visits):
+    con = duckdb.connect(":memory:")
+    con.execute(f"SET threads TO {THREADS}")
+    con.register("visits_frame", _visits)
+    con.execute("CREATE TABLE visits AS SELECT * FROM visits_frame")
+    con.unregister("visits_frame")
+    return con
+
+
+def _query(df, sql, params=()):
+    # 커서마다 별도 연결 — 여러 세션·선계산 스레드가 동시에 조회해도 안전
+    con = _database(df.attrs.get("snapshot"), df).cursor()
+    try:
+        return con.execute(sql, params).df()
+    finally:
+        con.close()
+
+
+def _segment_where(age_band, gender):
+    clauses = ['list_contains(?::VARCHAR[], "연령대"::VARCHAR)']
+    params = [list(age_band)]
+    if gender != "전체":
+        clauses.append('"성별" = ?')
+        params.append(gender)
+    return " AND ".join(clauses), params
+
+
+def compare_periods(df, start, end, offsets, age_band, gender):
+    """core.comparison.compare_periods와 같은 (daily, kpis) — 세그먼트 필터·기간 태깅·집계를 SQL 한 번으로."""
+    bounds = period_bounds(start, end, offsets)
+    values = ", ".join("(?, ?, ?)" for _ in bounds)
+    where, seg_params = _segment_where(age_band, gender)
+    params = [v for p, (lo, hi) in enumerate(bounds) for v in (p, lo.to_pydatetime(), hi.to_pydatetime())] + seg_params
+    tagged = f"""
+        WITH periods(period, lo, hi) AS (VALUES {values})
+        SELECT p.period, v."진료일자", v."환자번호", v."초/재진"
+        FROM visits v JOIN periods p ON v."진료일자" BETWEEN p.lo AND p.hi
+        WHERE {where}
+    """
+    counts = _query(df, f"""
+        SELECT period,
+               count(*) AS 진료횟수,
+               count(DISTINCT "환자번호") AS 환자수,
+               count(DISTINCT "환자번호") FILTER (WHERE "초/재진" = '신환') AS 신환수
+        FROM ({tagged}) GROUP BY period
+    """, params).set_index("period")
+    daily = _query(df, f"""
+        SELECT period, "진료일자", count(*) AS 진료횟수
+        FROM ({tagged}) GROUP BY period, "진료일자"
+    """, params)
+    counts.index = counts.index.astype("int16")
+    daily["period"] = daily["period"].astype("int16")
+    daily["진료일자"] = daily["진료일자"].astype(df["진료일자"].dtype)
+    return comparison_frames(counts.astype("int64"), daily.astype({"진료횟수": "int64"}), offsets)
+
+
+def region_performance(df, campaign_start, campaign_end, before_start, before_end, target_regions):
+    """core.campaign.region_performance와 같은 표 — 두 기간의 행정동별 고유 환자수·신환수를 SQL 한 번으로."""
+    perf = _query(df, """
+        SELECT "행정동",
+               count(DISTINCT "환자번호") FILTER (WHERE in_campaign) AS 환자수_캠페인,
+               count(DISTINCT "환자번호") FILTER (WHERE in_campaign AND "초/재진" = '신환') AS 신환수_캠페인,
+               count(DISTINCT "환자번호") FILTER (WHERE in_before) AS 환자수_이전,
+               count(DISTINCT "환자번호") FILTER (WHERE in_before AND "초/재진" = '신환') AS 신환수_이전
+        FROM (
+            SELECT *,
+                   "진료일자" BETWEEN ? AND ? AS in_campaign,
+                   "진료일자" BETWEEN ? AND ? AS in_before
+            FROM visits WHERE trim("행정동") <> ''
+        )
+        WHERE in_campaign OR in_before
+        GROUP BY "행정동" ORDER BY "행정동"
+    """, [pd.Timestamp(d).to_pydatetime() for d in (campaign_start, campaign_end, before_start, before_end)])
+    perf["행정동"] = perf["행정동"].astype(df["행정동"].dtype)
+    return region_rates(perf, target_regions)
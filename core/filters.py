@@ -0,0 +1,39 @@
+from datetime import datetime
+
+import streamlit as st
+
+from core.result_cache import signature
+
+# 사이드바 필터 일괄 적용
+# 필터 위젯은 st.form 안에 두어 값을 바꿔도 바로 rerun되지 않고, '필터 적용'을 누를 때 한 번에 반영한다.
+# 마지막으로 적용한 필터와 그 서명은 session_state에 보관해 다른 페이지에 다녀와도 그대로 복원한다.
+
+
+def _key(page):
+    return f"_filters_{page}"
+
+
+def applied_filters(page, defaults):
+    """마지막으로 적용한 필터. 아직 적용한 적이 없으면 defaults."""
+    state = st.session_state.get(_key(page))
+    if state is None:
+        return dict(defaults)
+    return {**defaults, **state["filters"]}
+
+
+def apply_filters(page, filters):
+    """폼 제출 값을 적용 필터로 저장. 서명이 직전과 같으면 False (다시 계산할 것이 없음)."""
+    sig = signature(filters)
+    state = st.session_state.get(_key(page))
+    if state is not None and state["signature"] == sig:
+        return False
+    st.session_state[_key(page)] = {"filters": dict(filters), "signature": sig, "applied_at": datetime.now()}
+    return True
+
+
+def applied_caption(page):
+    """사이드바에 표시할 마지막 적용 시각 문구."""
+    state = st.session_state.get(_key(page))
+    if state is None:
+        return "기본 필터로 조회 중"
+    return f"{state['applied_at']:%H:%M:%S} 적용 · 서명 `{state['signature'][:8]}`"
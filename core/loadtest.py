@@ -0,0 +1,378 @@
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 동시 세션 부하 테스트
+# 한 프로세스 안에서 N개의 세션(AppTest)이 세 페이지를 시나리오대로 조작하며 rerun할 때의 지연 시간을 잰다.
+# 배포 환경(Streamlit Cloud 단일 인스턴스)처럼 모든 세션이 같은 프로세스의 캐시·스레드 풀·GIL을 나눠 쓰므로
+# 동시 세션 수에 따른 rerun 지연(p50/p95/p99)과 최대 RSS·CPU 사용률로 수용 가능한 세션 수를 가늠할 수 있다.
+# 웹소켓·브라우저 렌더링 비용은 포함되지 않는다 (서버 쪽 스크립트 실행 시간만).
+# 사용:
+#   python -m core.loadtest --sessions 8 --rows 300000        # 합성 데이터(임시 SQLite)로
+#   DASHBOARD_DATA_SOURCE=sqlite DASHBOARD_DATA_PATH=data/dashboard.db python -m core.loadtest --sessions 16
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGES = ["환자정보.py", "pages/2_지역장악도.py", "pages/3_마케팅성과분석.py"]
+THINK_SECONDS = (0.2, 1.0)  # 조작 사이 대기 (균등 분포)
+TIMEOUT = 120
+
+
+# ── 시나리오 ──
+# 각 단계는 (이름, fn(at, rng)) — fn은 위젯을 조작만 하고 rerun(at.run)은 러너가 시간을 재며 실행한다.
+
+def _first_run(at, rng):
+    pass
+
+
+def _random_window(rng, lo, hi, min_days, max_days):
+    span = (hi - lo).days
+    start = lo + timedelta(days=int(rng.integers(0, max(span - min_days, 1))))
+    return start, min(start + timedelta(days=int(rng.integers(min_days, max_days))), hi)
+
+
+def _patients_dates(at, rng):
+    lo, hi = at.date_input[0].value, at.date_input[1].value
+    start, end = _random_window(rng, lo, hi, 30, 365)
+    at.date_input[0].set_value(start)
+    at.date_input[1].set_value(end)
+    at.button[0].click()
+
+
+def _patients_years(at, rng):
+    at.slider[0].set_value(int(rng.integers(1, 6)))
+    at.button[0].click()
+
+
+def _patients_basis(at, rng):
+    radio = at.radio[0]
+    radio.set_value(rng.choice(radio.options))
+
+
+def _patients_lazy(at, rng):
+    at.session_state["lazy_map"] = True
+    at.session_state["lazy_age"] = True
+
+
+def _select_random(box, rng):
+    options = [o for o in box.options if o != "전체"]
+    if options:
+        box.select(rng.choice(options))
+
+
+def _penetration_province(at, rng):
+    _select_random(at.selectbox(key="filter_province"), rng)
+
+
+def _penetration_city(at, rng):
+    _select_random(at.selectbox(key="filter_city"), rng)
+
+
+def _penetration_dong(at, rng):
+    _select_random(at.selectbox(key="filter_dong"), rng)
+
+
+def _penetration_months(at, rng):
+    at.slider[0].set_value(int(rng.integers(1, 25)))
+
+
+def _penetration_reset(at, rng):
+    at.selectbox(key="filter_province").select("전체")
+
+
+def _campaign_gu(at, rng):
+    _select_random(at.sidebar.selectbox[0], rng)
+
+
+def _campaign_targets(at, rng):
+    box = at.multiselect[0]
+    k = int(rng.integers(1, min(len(box.options), 4) + 1)) if box.options else 0
+    box.set_value(list(rng.choice(box.options, k, replace=False)) if k else [])
+    at.button[0].click()
+
+
+def _campaign_dates(at, rng):
+    end = at.date_input[1].value
+    start, end = _random_window(rng, end - timedelta(days=400), end, 14, 90)
+    at.date_input[0].set_value(start)
+    at.date_input[1].set_value(end)
+    at.button[0].click()
+
+
+def _campaign_lazy(at, rng):
+    for key in ("lazy_region", "lazy_new_patients", "lazy_revisit"):
+        at.session_state[key] = True
+
+
+SCENARIOS = {
+    "환자정보.py": [
+        ("첫 화면", _first_run), ("기간 변경", _patients_dates), ("비교 연도 변경", _patients_years),
+        ("집계 기준 변경", _patients_basis), ("지도·연령대 펼치기", _patients_lazy),
+    ],
+    "pages/2_지역장악도.py": [
+        ("첫 화면", _first_run), ("시/도 드릴다운", _penetration_province), ("시/군/구 드릴다운", _penetration_city),
+        ("행정동 드릴다운", _penetration_dong), ("활성 기간 변경", _penetration_months), ("전체로 복귀", _penetration_reset),
+    ],
+    "pages/3_마케팅성과분석.py": [
+        ("첫 화면", _first_run), ("시/군/구 변경", _campaign_gu), ("타겟 지역 변경", _campaign_targets),
+        ("캠페인 기간 변경", _campaign_dates), ("하단 분석 펼치기", _campaign_lazy),
+    ],
+}
+
+
+# ── 실행 ──
+
+class Recorder:
+    def __init__(self):
+        self.samples = []  # (페이지, 단계, ms, 오류)
+        self._lock = threading.Lock()
+
+    def add(self, page, step, ms, error=None):
+        with self._lock:
+            self.samples.append((page, step, ms, error))
+
+
+def _rss_mb():
+    """현재 상주 메모리(MB). /proc이 없는 플랫폼에서는 프로세스 최고치(ru_maxrss)로 대신한다."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except OSError:
+        scale = 1024 ** 2 if sys.platform == "darwin" else 1024  # ru_maxrss 단위: macOS 바이트, Linux KB
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+class ResourceSampler(threading.Thread):
+    """주기적으로 프로세스 CPU 사용률(코어 1개 = 100%)과 상주 메모리를 샘플링.
+    RSS는 단계(세션 수)마다 새 샘플러로 재므로, 프로세스 수명 최고치(ru_maxrss)와 달리 앞 단계의 최고치가 섞이지 않는다."""
+
+    def __init__(self, interval=0.5):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.cpu = []
+        self.rss = [_rss_mb()]
+        self._done = threading.Event()
+
+    def run(self):
+        last_cpu, last_wall = sum(os.times()[:2]), time.perf_counter()
+        while not self._done.wait(self.interval):
+            cpu, wall = sum(os.times()[:2]), time.perf_counter()
+            self.cpu.append((cpu - last_cpu) / (wall - last_wall) * 100)
+            self.rss.append(_rss_mb())
+            last_cpu, last_wall = cpu, wall
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.rss.append(_rss_mb())
+
+
+def _page_error(at):
+    # 스크립트 예외, 또는 페이지가 st.error로 알리고 멈춘 경우(데이터 로드 실패 등)
+    if at.exception:
+        return str(at.exception[0].value)
+    if at.error:
+        return str(at.error[0].value)
+    return None
+
+
+def run_session(session, iterations, recorder, seed):
+    from streamlit.testing.v1 import AppTest
+
+    rng = np.random.default_rng(seed + session)
+    for _ in range(iterations):
+        for page in PAGES:
+            at = AppTest.from_file(str(ROOT / page), default_timeout=TIMEOUT)
+            at.session_state["authenticated"] = True
+            for step, action in SCENARIOS[page]:
+                if step != "첫 화면":
+                    time.sleep(rng.uniform(*THINK_SECONDS))
+                try:
+                    action(at, rng)
+                    t0 = time.perf_counter()
+                    at.run()
+                    ms = (time.perf_counter() - t0) * 1000
+                    error = _page_error(at)
+                except Exception as e:  # 시나리오 조작 실패도 기록하고 다음 단계로
+                    ms, error = float("nan"), f"{type(e).__name__}: {e}"
+                recorder.add(page, step, ms, error)
+
+
+def percentiles(values):
+    values = np.asarray([v for v in values if v == v])
+    if not len(values):
+        return {"n": 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"n": len(values), "p50_ms": round(p50, 1), "p95_ms": round(p95, 1), "p99_ms": round(p99, 1), "max_ms": round(values.max(), 1)}
+
+
+STREAMLIT_VERSION = "1.66"  # _shared_runtime이 맞춰 둔 Streamlit 내부 구조의 버전
+
+
+def _check_streamlit():
+    """_shared_runtime이 바꾸는 Streamlit 내부가 이 버전과 같은지 확인. 다르면 조용히 왜곡된 결과를 내는 대신 멈춘다."""
+    import streamlit
+    from streamlit import config
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    version = ".".join(streamlit.__version__.split(".")[:2])
+    missing = [
+        name for name, ok in [
+            ("Runtime._instance", hasattr(Runtime, "_instance")),
+            ("Runtime.instance", hasattr(Runtime, "instance")),
+            ("Runtime.exists", hasattr(Runtime, "exists")),
+            ("ScriptCache.get_bytecode", hasattr(ScriptCache, "get_bytecode")),
+            ("config._set_option", hasattr(config, "_set_option")),
+        ] if not ok
+    ]
+    if version != STREAMLIT_VERSION or missing:
+        raise RuntimeError(
+            f"부하 테스트는 Streamlit {STREAMLIT_VERSION}의 내부 구조(런타임·스크립트 캐시 공유)에 맞춰져 있습니다. "
+            f"설치된 버전: {streamlit.__version__}" + (f", 없는 내부 속성: {', '.join(missing)}" if missing else "")
+            + ". core/loadtest.py의 _shared_runtime을 새 버전에 맞게 확인한 뒤 STREAMLIT_VERSION을 올려 주세요."
+        )
+
+
+@contextmanager
+def _shared_runtime():
+    """AppTest는 rerun마다 전역 Runtime을 모의 객체로 바꿨다가 끝나면 None으로 돌려놓고, config를 잠시 바꾸고,
+    스크립트를 새 ScriptCache로 다시 컴파일한다. 세션들이 동시에 돌면 서로의 실행 중에 런타임이 지워지고
+    동시 compile()이 AST 오류를 내므로, 실제 서버처럼 런타임·스크립트 캐시를 프로세스에서 하나씩 공유하게 한다.
+    with 블록을 벗어나면 바꾼 속성과 config 값을 원래대로 되돌린다."""
+    _check_streamlit()
+    from streamlit import config
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    option = config.get_config_options()["global.appTest"]
+    saved_option = (option.value, option.where_defined)
+    saved = [(Runtime, "instance", Runtime.__dict__["instance"]), (Runtime, "exists", Runtime.__dict__["exists"]),
+             (ScriptCache, "get_bytecode", ScriptCache.__dict__["get_bytecode"])]
+    config._set_option("global.appTest", True, "loadtest")
+    last = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last["runtime"] = cls._instance
+        if "runtime" not in last:
+            raise RuntimeError("Runtime hasn't been created!")
+        return last["runtime"]
+
+    def exists(cls):
+        return cls._instance is not None or "runtime" in last
+
+    scripts, get_bytecode = ScriptCache(), ScriptCache.get_bytecode
+    try:
+        Runtime.instance = classmethod(instance)
+        Runtime.exists = classmethod(exists)
+        ScriptCache.get_bytecode = lambda self, path: get_bytecode(scripts, path)
+        yield
+    finally:
+        for owner, name, original in saved:
+            setattr(owner, name, original)
+        config._set_option("global.appTest", *saved_option)
+
+
+def run(sessions, iterations=1, seed=0):
+    recorder, sampler = Recorder(), ResourceSampler()
+    sampler.start()
+    began = time.perf_counter()
+    threads = [
+        threading.Thread(target=run_session, args=(i, iterations, recorder, seed), name=f"session-{i}")
+        for i in range(sessions)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - began
+    sampler.stop()
+
+    steps = {}
+    for page, step, ms, _ in recorder.samples:
+        steps.setdefault(f"{Path(page).stem} · {step}", []).append(ms)
+    errors = [(page, step, error) for page, step, _, error in recorder.samples if error]
+    cpu = sampler.cpu or [0.0]
+    return {
+        "sessions": sessions,
+        "iterations": iterations,
+        "wall_s": round(wall, 1),
+        "reruns": len(recorder.samples),
+        "reruns_per_s": round(len(recorder.samples) / wall, 2),
+        "overall": percentiles([s[2] for s in recorder.samples]),
+        "steps": {name: percentiles(values) for name, values in steps.items()},
+        "errors": len(errors),
+        "error_samples": [f"{Path(p).stem} · {s}: {e}" for p, s, e in errors[:5]],
+        "peak_rss_mb": round(max(sampler.rss), 1),
+        "cpu_mean_pct": round(float(np.mean(cpu)), 1),
+        "cpu_peak_pct": round(float(np.max(cpu)), 1),
+    }
+
+
+def _prepare_source(rows, seed):
+    """데이터 원천이 지정되지 않았으면 합성 데이터를 임시 SQLite에 만들어 쓴다."""
+    if os.environ.get("DASHBOARD_DATA_SOURCE"):
+        return
+    from core import synthetic
+    from core.sources import SQLiteSource
+
+    path = Path(tempfile.mkdtemp(prefix="dashboard-load-")) / "synthetic.db"
+    synthetic.write(SQLiteSource(path), rows, seed=seed)
+    os.environ["DASHBOARD_DATA_SOURCE"] = "sqlite"
+    os.environ["DASHBOARD_DATA_PATH"] = str(path)
+    print(f"# 합성 데이터 {rows:,}행 → {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="동시 세션 rerun 부하 테스트")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 8], help="동시 세션 수 (여러 개면 차례로)")
+    parser.add_argument("--iterations", type=int, default=1, help="세션당 세 페이지 시나리오 반복 횟수")
+    parser.add_argument("--rows", type=int, default=300_000, help="원천 미지정 시 합성 데이터 행 수")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, help="결과 JSON 저장 경로")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    os.chdir(ROOT)
+    from streamlit.logger import set_log_level
+
+    set_log_level("error")
+    warnings.simplefilter("ignore", pd.errors.PerformanceWarning)
+    # 섹션별 구조화 로그는 rerun마다 수십 줄 — 집계 결과만 보이도록 끈다
+    # (core.profiling은 처음 import될 때 로거를 INFO로 설정하므로 import한 뒤에 낮춘다)
+    from core.profiling import logger as profiling_logger
+
+    profiling_logger.setLevel(logging.WARNING)
+    _prepare_source(args.rows, args.seed)
+    reports = []
+    for n in args.sessions:
+        with _shared_runtime():
+            report = run(n, args.iterations, args.seed)
+        reports.append(report)
+        o = report["overall"]
+        print(
+            f"세션 {n:>3}  rerun {report['reruns']:>4}회 ({report['reruns_per_s']}/s)  "
+            f"p50 {o.get('p50_ms', 0):>7.0f}ms  p95 {o.get('p95_ms', 0):>7.0f}ms  p99 {o.get('p99_ms', 0):>7.0f}ms  "
+            f"RSS {report['peak_rss_mb']:,.0f}MB  CPU 평균 {report['cpu_mean_pct']:.0f}% / 최대 {report['cpu_peak_pct']:.0f}%  "
+            f"오류 {report['errors']}"
+        )
+        for name, stats in report["steps"].items():
+            print(f"    {name:<28} p50 {stats.get('p50_ms', 0):>7.0f}ms  p95 {stats.get('p95_ms', 0):>7.0f}ms  (n={stats['n']})")
+        for sample in report["error_samples"]:
+            print(f"    ! {sample}")
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps(reports, ensure_ascii=False, indent=1), encoding="utf-8")
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import streamlit as st
+
+from core.sources import setting
+
+# 월 단위 파티션 진료 기록 저장소
+# 전처리한 진료 기록을 월별 Arrow IPC 파일(visits/YYYY-MM.arrow)로 나눠 두고, 읽을 때는 메모리 맵으로 연다.
+# - 문자열 열(진료 기록 메모리 대부분)은 맵된 파일 버퍼를 그대로 참조해 상주 메모리에 복사되지 않는다.
+#   OS가 필요한 페이지만 읽고 압박이 오면 내려놓으므로 이력이 쌓여도 상주 메모리는 거의 늘지 않는다.
+# - 기간 조회는 파티션을 가려 읽지 않는다. 방문 순번·다음 방문 간격이 환자 전체 이력에서 파생되므로
+#   페이지의 기간 조회(core.data.visits_for)는 모든 월을 이어 붙인 공유 프레임(load)을 거른다.
+# - sync는 내용이 바뀐 월만 다시 쓴다. 지난 달 파티션은 보통 그대로라 재적재 비용이 최근 월에 비례한다.
+# 사용: DASHBOARD_VISIT_STORE=<디렉터리> 또는 secrets [data_source] visit_store.
+
+MANIFEST = "manifest.json"
+
+
+def _digest(part):
+    return hashlib.sha1(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes()).hexdigest()
+
+
+class VisitStore:
+    def __init__(self, root):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+
+    def _path(self, month):
+        return self.root / "visits" / f"{month}.arrow"
+
+    def manifest(self):
+        path = self.root / MANIFEST
+        if not path.exists():
+            return {}
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def sync(self, df):
+        """df(전처리된 전체 진료 기록)를 월별 파티션으로 저장. 바뀐 월만 다시 쓰고 사라진 월은 지운다. 다시 쓴 월 목록을 반환."""
+        months = df['진료일자'].dt.strftime('%Y-%m')
+        with self._lock:
+            old = self.manifest()
+            new, written = {}, []
+            (self.root / "visits").mkdir(parents=True, exist_ok=True)
+            for month, part in df.groupby(months, sort=True):
+                digest = _digest(part)
+                if old.get(month, {}).get("digest") != digest or not self._path(month).exists():
+                    table = pa.Table.from_pandas(part, preserve_index=False)
+                    tmp = self._path(month).with_suffix(".tmp")
+                    with ipc.new_file(tmp, table.schema) as writer:
+                        writer.write_table(table)
+                    # 교체는 원자적으로 — 이전 파일을 맵해 둔 프레임은 옛 inode를 계속 읽는다
+                    os.replace(tmp, self._path(month))
+                    written.append(month)
+                new[month] = {"rows": len(part), "digest": digest}
+            for month in set(old) - set(new):
+                self._path(month).unlink(missing_ok=True)
+            tmp = self.root / f"{MANIFEST}.tmp"
+            tmp.write_text(json.dumps(new, ensure_ascii=False, indent=1), encoding="utf-8")
+            os.replace(tmp, self.root / MANIFEST)
+        return written
+
+    def _read(self, month):
+        return ipc.open_file(pa.memory_map(str(self._path(month)))).read_all()
+
+    def load(self):
+        """모든 월 파티션을 메모리 맵으로 읽어 이어 붙인 프레임 (월 순서, 같은 달 안에서는 원본 순서)."""
+        months = sorted(self.manifest())
+        return pa.concat_tables([self._read(month) for month in months]).to_pandas() if months else pd.DataFrame()
+
+
+# 프로세스당 하나 — 설정이 없으면 None (공유 프레임을 그대로 쓴다)
+@st.cache_resource
+def visit_store():
+    root = setting("DASHBOARD_VISIT_STORE", "visit_store")
+    return VisitStore(root) if root else None
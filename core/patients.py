@@ -0,0 +1,98 @@
+import pandas as pd
+
+# 환자정보 페이지 계산 — Streamlit 호출 없이 (프레임, 필터) → 결과만 돌려준다
+
+DAY_KR = {'Monday':'월요일','Tuesday':'화요일','Wednesday':'수요일','Thursday':'목요일','Friday':'금요일','Saturday':'토요일','Sunday':'일요일'}
+WEEKDAY_ORDER = ['월요일','화요일','수요일','목요일','금요일','토요일','일요일']
+TREND_FREQ = {"주별": "W", "월별": "ME", "년별": "YE"}
+TREND_BASES = ["일별", "주별", "월별", "년별"]
+
+
+def default_filters(df):
+    """사이드바 필터 기본값 — 전체 기간, 전 연령대, 전체 성별, 전년 동기 1개."""
+    return {
+        "start_date": df['진료일자'].min().date(),
+        "end_date": df['진료일자'].max().date(),
+        "age_band": df['연령대'].cat.categories.tolist(),
+        "gender": "전체",
+        "compare_years": 1,
+    }
+
+
+def view_params(filters):
+    """결과 캐시 키로 쓰는 조회 조건 (페이지와 선계산이 같은 키를 만들도록 한 곳에서 정의)."""
+    return {
+        "start": pd.to_datetime(filters["start_date"]),
+        "end": pd.to_datetime(filters["end_date"]),
+        "age_band": filters["age_band"],
+        "gender": filters["gender"],
+    }
+
+
+def filter_segment(df, age_band, gender):
+    segment = df[df['연령대'].isin(age_band)]
+    if gender != "전체":
+        segment = segment[segment['성별'] == gender]
+    return segment
+
+
+def filter_period(df, start, end):
+    return df[(df['진료일자'] >= pd.Timestamp(start)) & (df['진료일자'] <= pd.Timestamp(end))]
+
+
+def data_completeness(filtered):
+    """필터된 진료 건 중 행정동 정보가 있는 비율."""
+    return len(filtered[filtered['행정동'] != '']) / len(filtered) if len(filtered) else 0
+
+
+def visit_trend(filtered, basis):
+    """집계 기준(일별/주별/월별/년별) 진료횟수와 이동평균."""
+    if basis == "일별":
+        daily = (
+            filtered
+            .groupby('진료일자')
+            .size()
+            .reset_index(name='진료횟수')
+            .sort_values('진료일자')
+        )
+    else:
+        daily = (
+            filtered
+            .groupby(pd.Grouper(key='진료일자', freq=TREND_FREQ[basis]))
+            .size()
+            .reset_index(name='진료횟수')
+            .sort_values('진료일자')
+        )
+
+    # 이동평균 컬럼 추가
+    for window in (6, 30, 60, 90):
+        daily[f'MA{window}'] = daily['진료횟수'].rolling(window=window, min_periods=1).mean()
+    return daily
+
+
+def weekday_hour_heatmap(filtered):
+    weekday = filtered['진료일자'].dt.day_name().map(DAY_KR)
+    return (
+        filtered.assign(요일=weekday)
+        .groupby(['요일', '진료시간대']).size()
+        .reset_index(name='count')
+    )
+
+
+def patient_points(filtered):
+    """고유 환자별 (위도, 경도) 목록 — 좌표가 빈 환자는 제외."""
+    unique_patients = filtered.drop_duplicates(subset='환자번호')
+    coords = unique_patients[['y', 'x']].replace("", pd.NA).dropna()
+    return list(coords.itertuples(index=False, name=None))
+
+
+def age_distribution(filtered):
+    age_dist = (
+        filtered.drop_duplicates(subset='환자번호')
+        .groupby('연령대', observed=False)['환자번호']
+        .nunique()
+        .reset_index(name='환자수')
+    )
+    age_dist = age_dist[age_dist['환자수'] > 0]
+    total = age_dist['환자수'].sum()
+    return age_dist.assign(비율=age_dist['환자수'] / total)
@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+# 지역장악도 페이지 계산 — 인구 대비 환자 비율(장악도)을 선택 지역·하위 지역·연령대별로 산출
+
+AGE_ORDER = ["9세이하"]+[f"{i}대" for i in range(10,100,10)]+["100세이상"]
+DEFAULT_MONTHS = 12
+
+
+def active_cutoff(months):
+    return datetime.now() - timedelta(days=30*months)
+
+
+def view_params(months, cutoff, province, city, dong):
+    """결과 캐시 키 — cutoff는 날짜 단위로 같으면 같은 조회."""
+    return {"months": months, "cutoff": cutoff.date(), "province": province, "city": city, "dong": dong}
+
+
+def drilldown_target(province, city, region):
+    """랭킹에서 region 막대를 클릭했을 때 이동할 (시/도, 시/군/구, 행정동)."""
+    if province == "전체":
+        return region, "전체", "전체"
+    if city == "전체":
+        return province, region, "전체"
+    return province, city, region
+
+
+def build_mask(df, province, city, dong):
+    mask = pd.Series(True, index=df.index)
+    if province != "전체":
+        mask &= df["시/도"] == province
+    if city != "전체":
+        mask &= df["시/군/구"] == city
+    if dong != "전체":
+        mask &= df["행정동"] == dong
+    return mask
+
+
+def select_population(pop_df, province, city, dong):
+    """선택 지역의 인구 행 (시/도·시/군/구·행정동·전체인구 열 보장)."""
+    if dong!="전체":
+        # single-row => DataFrame
+        pop_sel = pop_df.loc[[(province,city,dong)]].reset_index()
+    elif city!="전체":
+        pop_sel = pop_df.loc[(province,city)].reset_index()
+    elif province!="전체":
+        pop_sel = pop_df.loc[province].reset_index()
+    else:
+        pop_sel = pop_df.reset_index()
+
+    # ensure id_vars exist
+    pop_sel["시/도"]    = province if province!="전체" else pop_sel.get("시/도","")
+    pop_sel["시/군/구"] = city if city!="전체" else pop_sel.get("시/군/구","")
+    pop_sel["행정동"]   = dong if dong!="전체" else pop_sel.get("행정동","")
+    pop_sel["전체인구"] = pop_sel["전체인구"].fillna(0)
+    return pop_sel
+
+
+def age_penetration(active_sel, pop_sel):
+    """연령대별 인구수·활성 환자수·장악도(%)."""
+    grouped_pat = (
+        active_sel
+        .groupby("연령대", observed=False)["환자번호"]
+        .nunique()
+        .reset_index(name="환자수")
+    )
+
+    # melt → merge → calc
+    age_cols = [c for c in pop_sel.columns if c in grouped_pat["연령대"].tolist()]
+    pop_melt = pop_sel.melt(
+        id_vars=["시/도","시/군/구","행정동","전체인구"],
+        value_vars=age_cols,
+        var_name="연령대", value_name="인구수"
+    )
+
+    pop_melt["인구수"] = (
+        pop_melt["인구수"].astype(str).str.replace(",","")
+          .pipe(pd.to_numeric, errors="coerce")
+    )
+
+    grouped_pop = pop_melt.groupby('연령대')['인구수'].sum().reset_index(name='인구수')
+
+    merge_sel = (
+        pd.merge(grouped_pop, grouped_pat, on="연령대", how="left")
+          .fillna({"환자수":0})
+    )
+    merge_sel["장악도(%)"] = (
+        merge_sel["환자수"]/merge_sel["인구수"]*100
+    )
+    return merge_sel
+
+
+def sub_region_ranking(pop_df, pop_sel, active, province, city):
+    """선택 지역 바로 아래 단계 지역들의 장악도 랭킹. (하위 단계 열 이름, 랭킹 표 또는 None)"""
+    if province == "전체":
+        sub_col = "시/도"
+        sub_regions = pop_df.index.get_level_values(0).unique()
+    elif city == "전체":
+        sub_col = "시/군/구"
+        sub_regions = pop_df.loc[province].index.get_level_values(0).unique()
+    else:
+        sub_col = "행정동"
+        sub_regions = pop_df.loc[(province, city)].index.get_level_values(0).unique()
+
+    ranking_data = []
+    for region in sub_regions:
+        if province == "전체":
+            sub_pop = pop_df.loc[region]["전체인구"].sum()
+            sub_patients = active[active["시/도"] == region]["환자번호"].nunique()
+        else:
+            sub_pop = pop_sel[pop_sel[sub_col] == region]["전체인구"].sum()
+            sub_patients = active[active[sub_col] == region]["환자번호"].nunique()
+        if sub_pop > 0:
+            ranking_data.append({
+                "지역": region,
+                "인구수": sub_pop,
+                "환자수": sub_patients,
+                "장악도(%)": sub_patients / sub_pop * 100
+            })
+
+    if not ranking_data:
+        return sub_col, None
+    ranking_df = pd.DataFrame(ranking_data).sort_values("장악도(%)", ascending=False)
+    ranking_df["label"] = ranking_df.apply(lambda r: f"{r['지역']}  {r['장악도(%)']:.2f}%", axis=1)
+    return sub_col, ranking_df
+
+
+def penetration_view(patient_df, pop_df, cutoff, province, city, dong):
+    """한 지역 선택에 대한 KPI·연령대 장악도·하위 지역 랭킹 전체."""
+    active = patient_df[patient_df["진료일자"]>=cutoff]
+    pop_sel = select_population(pop_df, province, city, dong)
+
+    mask_act = build_mask(active, province, city, dong)
+    merge_sel = age_penetration(active[mask_act], pop_sel)
+
+    total_pop       = int(pop_sel["전체인구"].sum())
+    total_patients  = patient_df[build_mask(patient_df,province,city,dong)]["환자번호"].nunique()
+    active_patients = active[mask_act]["환자번호"].nunique()
+
+    view = {
+        "merge_sel": merge_sel,
+        "total_pop": total_pop,
+        "total_patients": total_patients,
+        "active_patients": active_patients,
+        "region_pen": total_patients/total_pop*100 if total_pop else 0,
+        "period_pen": active_patients/total_pop*100 if total_pop else 0,
+        "sub_col": None,
+        "ranking_df": None,
+    }
+    if dong == "전체":
+        view["sub_col"], view["ranking_df"] = sub_region_ranking(pop_df, pop_sel, active, province, city)
+    return view
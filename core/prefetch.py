@@ -0,0 +1,155 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+
+import streamlit as st
+
+from core import campaign, duck, patients, penetration
+from core.comparison import compare_periods, period_bounds, year_offsets
+from core.data import load_all, load_patient_data, load_population, load_visits, visits_for
+from core.registry import campaign_registry
+from core.result_cache import result_cache, signature, snapshot_version
+
+# 백그라운드 선계산
+# 사용자가 곧 요청할 가능성이 높은 결과(드릴다운할 하위 지역, 각 페이지의 기본 화면)를 스레드 풀에서 미리 계산해
+# 결과 캐시에 shared_result와 같은 키로 넣어 둔다. 실제 요청이 계산 도중에 오면 결과 캐시의 single-flight로 그 계산을 기다린다.
+# 계산 함수는 세션 상태나 위젯에 접근하지 않는 순수 함수여야 한다 (백그라운드 스레드에는 세션이 없다).
+
+MAX_WORKERS = 2
+PREFETCH_TOP_K = 5
+
+logger = logging.getLogger("dashboard.prefetch")
+
+
+class Prefetcher:
+    def __init__(self, max_workers=MAX_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def submit(self, namespace, params, compute, *sources):
+        cache = result_cache()
+        key = (namespace, snapshot_version(*sources), signature(params))
+        with self._lock:
+            if key in self._pending or cache.peek(*key):
+                self.skipped += 1
+                return False
+            self._pending.add(key)
+            self.submitted += 1
+        self._pool.submit(self._run, cache, key, compute)
+        return True
+
+    def _run(self, cache, key, compute):
+        try:
+            cache.get_or_compute(*key, compute)
+        except Exception:
+            self.failed += 1
+            logger.exception("prefetch failed: %s", key[0])
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def run(self, func):
+        """결과 캐시와 무관한 작업(예: 원천 데이터 로드)을 풀에서 실행."""
+        return self._pool.submit(func)
+
+    def report(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "submitted": self.submitted,
+                "skipped": self.skipped,
+                "failed": self.failed,
+            }
+
+
+@st.cache_resource
+def prefetcher():
+    return Prefetcher()
+
+
+def prefetch(namespace, params, compute, *sources):
+    """shared_result와 같은 키로 결과를 백그라운드에서 미리 계산. 이미 캐시에 있거나 대기 중이면 건너뛴다."""
+    return prefetcher().submit(namespace, params, compute, *sources)
+
+
+# ── 기본 화면 워밍업 ──
+# 각 페이지가 필터를 건드리지 않은 첫 화면에서 요청하는 결과를 페이지와 같은 키로 계산한다.
+
+def _warm_patients():
+    df = load_visits()
+    filters = patients.default_filters(df)
+    view = patients.view_params(filters)
+    start, end, years = view["start"], view["end"], filters["compare_years"]
+    segment = patients.filter_segment(visits_for(period_bounds(start, end, year_offsets(years))), filters["age_band"], filters["gender"])
+    filtered = patients.filter_period(segment, start, end)
+    basis = patients.TREND_BASES[0]
+
+    if duck.enabled():
+        compare = partial(duck.compare_periods, df, start, end, year_offsets(years), filters["age_band"], filters["gender"])
+    else:
+        compare = partial(compare_periods, segment, start, end, year_offsets(years))
+    prefetch("환자정보.비교", {**view, "compare_years": years}, compare, df)
+    prefetch("환자정보.완성도", view, partial(patients.data_completeness, filtered), df)
+    prefetch("환자정보.추이", {**view, "basis": basis}, partial(patients.visit_trend, filtered, basis), df)
+    prefetch("환자정보.히트맵", view, partial(patients.weekday_hour_heatmap, filtered), df)
+
+
+def _warm_penetration():
+    pop_df, (patient_df, _) = load_all(load_population, load_patient_data)
+    months = penetration.DEFAULT_MONTHS
+    cutoff = penetration.active_cutoff(months)
+    prefetch("지역장악도.뷰", penetration.view_params(months, cutoff, "전체", "전체", "전체"),
+             partial(penetration.penetration_view, patient_df, pop_df, cutoff, "전체", "전체", "전체"),
+             patient_df, pop_df)
+
+
+def _warm_campaign():
+    df = load_visits()
+    dong_options = sorted(df.loc[df['행정동'].str.strip().astype(bool), '행정동'].unique().tolist())
+    params = campaign.campaign_params(
+        campaign.default_settings(dong_options, datetime.now().date(), campaign_registry().latest_targets()))
+    start, end, targets = params["campaign_start"], params["campaign_end"], params["target_regions"]
+    window = visits_for(campaign.campaign_windows(start, end, params["before_start"], params["before_end"]))
+    campaign_data, before_data, _ = campaign.campaign_periods(window, start, end, params["before_start"], params["before_end"])
+    campaign_target, campaign_non_target = campaign.split_target(campaign_data, targets)
+    before_target, before_non_target = campaign.split_target(before_data, targets)
+
+    prefetch("마케팅.완성도", params, partial(campaign.completeness, campaign_data), df)
+    prefetch("마케팅.KPI", params, partial(campaign.campaign_kpis, campaign_target, before_target), df)
+    prefetch("마케팅.순수효과", params,
+             partial(campaign.new_patient_lift, campaign_target, before_target, campaign_non_target, before_non_target), df)
+    prefetch("마케팅.신뢰구간", params, partial(campaign.lift_intervals, campaign_data, before_data, targets), df)
+    prefetch("마케팅.트렌드", params, partial(campaign.daily_new_trend, window, start, end, targets), df)
+    # 기준선이 읽는 일자×행정동 신환 표는 페이지와 같은 키로 여기서 바로 만든다
+    matrix = result_cache().get_or_compute("마케팅.일별신환", snapshot_version(df), signature({}), partial(campaign.daily_new_matrix, df))
+    prefetch("마케팅.기준선", params, partial(campaign.expected_baseline, matrix, start, end, targets), df)
+
+
+def _warm_registry():
+    # 저장된 캠페인 중 기간에 진료 기록이 바뀐 것만 다시 계산
+    refreshed = campaign_registry().refresh(load_visits())
+    if refreshed:
+        logger.info("saved campaigns refreshed: %s", ", ".join(refreshed))
+
+
+def _warm(step):
+    try:
+        step()
+    except Exception:
+        logger.exception("warm-up failed: %s", step.__name__)
+
+
+@st.cache_resource
+def warm_up():
+    """프로세스당 한 번 — 서버가 뜬 뒤 첫 요청에서 세 페이지 기본 화면을 백그라운드로 채운다.
+    어느 페이지로 먼저 들어와도 시작되도록 모든 페이지가 authenticate() 전에 호출하므로, 사용자가 로그인하는 동안에도 진행된다."""
+    pool = prefetcher()
+    for step in (_warm_patients, _warm_penetration, _warm_campaign, _warm_registry):
+        pool.run(partial(_warm, step))
+    return datetime.now()
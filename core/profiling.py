@@ -0,0 +1,183 @@
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+
+import altair as alt
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# 섹션별 실행 시간 계측
+# 각 페이지의 논리적 섹션을 section()으로 감싸면 소요 시간과 행 수가 구조화 로그(JSON 한 줄)로 남고,
+# 현재 rerun의 타임라인이 session_state에 쌓여 개발자 오버레이(?dev=1)에서 워터폴로 보인다.
+# 위젯이 있는 독립 섹션은 fragment()로 감싸 그 위젯이 바뀔 때 해당 섹션만 다시 실행되게 하고,
+# rerun마다 작업 카운터(실행한 섹션 수, 처리 행 수, 캐시 미스로 새로 한 계산 수)를 남겨 부분 rerun의 작업량을 확인한다.
+
+logger = logging.getLogger("dashboard.profiling")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_RUN_KEY = "_profile_run"
+_HISTORY_KEY = "_profile_history"
+_HISTORY_SIZE = 20
+APP_SCOPE = "전체"
+
+
+def start_run(page, scope=APP_SCOPE):
+    """페이지 스크립트 맨 위에서 호출 — 이번 rerun의 타임라인을 새로 시작한다."""
+    st.session_state[_RUN_KEY] = {
+        "page": page,
+        "scope": scope,
+        "run_id": uuid.uuid4().hex[:8],
+        "started": time.perf_counter(),
+        "sections": [],
+        "work": {},
+    }
+
+
+def _current_run():
+    run = st.session_state.get(_RUN_KEY)
+    if run is None:
+        start_run("unknown")
+        run = st.session_state[_RUN_KEY]
+    return run
+
+
+def count(key, n=1):
+    """이번 rerun의 작업 카운터를 n만큼 올린다. 세션 밖(백그라운드 스레드 등)에서는 무시."""
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return
+    work = _current_run()["work"]
+    work[key] = work.get(key, 0) + n
+
+
+def finish_run():
+    """이번 rerun의 요약(범위, 총 소요, 작업 카운터)을 로그로 남기고 최근 이력에 쌓는다."""
+    run = _current_run()
+    summary = {
+        "page": run["page"],
+        "run_id": run["run_id"],
+        "scope": run["scope"],
+        "ms": round((time.perf_counter() - run["started"]) * 1000, 2),
+        **run["work"],
+    }
+    logger.info(json.dumps({"event": "run", **summary}, ensure_ascii=False))
+    history = st.session_state.setdefault(_HISTORY_KEY, [])
+    history.append(summary)
+    del history[:-_HISTORY_SIZE]
+    return summary
+
+
+def _overlay_on():
+    return st.query_params.get("dev") == "1" and st.session_state.get("_profile_overlay", False)
+
+
+def _work_text(summary):
+    return " · ".join(f"{k} {summary.get(k, 0):,}" for k in ("섹션", "계산", "행"))
+
+
+def fragment(name, **fragment_kwargs):
+    """st.fragment로 감싼 독립 섹션. 섹션 안 위젯을 바꾸면 이 함수만 다시 실행되고,
+    그 부분 rerun은 name 범위의 별도 rerun으로 계측된다."""
+    def decorator(func):
+        @st.fragment(**fragment_kwargs)
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            ctx = get_script_run_ctx()
+            partial = bool(ctx and ctx.fragment_ids_this_run)
+            if partial:
+                start_run(_current_run()["page"], scope=name)
+            result = func(*args, **kwargs)
+            if partial:
+                summary = finish_run()
+                if _overlay_on():
+                    # 사이드바 오버레이는 부분 rerun에서 다시 그려지지 않으므로 섹션 안에 표시
+                    st.caption(f"⏱ 부분 rerun `{summary['run_id']}` ({name}) {summary['ms']:,.0f}ms · {_work_text(summary)}")
+            return result
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def section(name):
+    """with section("필터링") as sec: ...; sec["rows"] = len(filtered)"""
+    run = _current_run()
+    record = {"section": name, "rows": None}
+    t0 = time.perf_counter()
+    try:
+        yield record
+    finally:
+        t1 = time.perf_counter()
+        record["start_ms"] = (t0 - run["started"]) * 1000
+        record["ms"] = (t1 - t0) * 1000
+        run["sections"].append(record)
+        count("섹션")
+        if record["rows"]:
+            count("행", record["rows"])
+        logger.info(json.dumps({
+            "event": "section",
+            "page": run["page"],
+            "run_id": run["run_id"],
+            "section": name,
+            "ms": round(record["ms"], 2),
+            "rows": record["rows"],
+        }, ensure_ascii=False))
+
+
+def render_overlay():
+    """페이지 맨 끝에서 호출 — rerun 요약을 기록한다. ?dev=1 로 접속한 경우에만 사이드바에 토글이 나타난다."""
+    summary = finish_run()
+    if st.query_params.get("dev") != "1":
+        return
+    if not st.sidebar.toggle("⏱ 섹션별 실행 시간", key="_profile_overlay"):
+        return
+
+    run = _current_run()
+    timeline = pd.DataFrame(run["sections"])
+    if timeline.empty:
+        st.sidebar.caption("계측된 섹션이 없습니다.")
+        return
+
+    timeline["end_ms"] = timeline["start_ms"] + timeline["ms"]
+    total_ms = (time.perf_counter() - run["started"]) * 1000
+    st.sidebar.caption(f"rerun `{run['run_id']}` 총 {total_ms:,.0f}ms · 섹션 합계 {timeline['ms'].sum():,.0f}ms")
+    st.sidebar.caption(f"작업: {_work_text(summary)}")
+
+    waterfall = (
+        alt.Chart(timeline)
+        .mark_bar(cornerRadius=2)
+        .encode(
+            x=alt.X("start_ms:Q", title="ms"),
+            x2="end_ms:Q",
+            y=alt.Y("section:N", sort=timeline["section"].tolist(), title=None),
+            color=alt.Color("ms:Q", scale=alt.Scale(scheme="orangered"), legend=None),
+            tooltip=[
+                alt.Tooltip("section:N", title="섹션"),
+                alt.Tooltip("ms:Q", title="소요(ms)", format=",.1f"),
+                alt.Tooltip("rows:Q", title="행 수", format=","),
+            ],
+        )
+        .properties(height=max(len(timeline) * 22, 120))
+    )
+    st.sidebar.altair_chart(waterfall, width="stretch")
+
+    # 최근 rerun 이력 — 부분(fragment) rerun이 전체 rerun보다 적은 작업만 했는지 비교
+    history = pd.DataFrame(st.session_state.get(_HISTORY_KEY, [])).reindex(
+        columns=["run_id", "scope", "ms", "섹션", "계산", "행"]
+    )
+    st.sidebar.dataframe(
+        history.iloc[::-1].fillna(0),
+        hide_index=True,
+        width="stretch",
+        column_config={
+            "scope": st.column_config.TextColumn("범위"),
+            "ms": st.column_config.NumberColumn("ms", format="%.0f"),
+        },
+    )
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import pickle
+import sqlite3
+import threading
+from datetime import date, datetime
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+from core import campaign as cp
+from core.result_cache import result_cache, signature, snapshot_version
+from core.sources import setting
+
+# 캠페인 저장소
+# 캠페인 정의(이름·기간·비교 기준·타겟 행정동)를 로컬 SQLite에 저장하고, 저장할 때 페이지 상단 결과
+# (완성도·KPI·순수 효과·신뢰구간·트렌드·지역별 성과)를 페이지와 같은 계산으로 만들어 함께 저장한다.
+# 결과에는 캠페인이 읽는 기간(campaign_windows)의 진료 기록 지문을 남겨, 데이터가 다시 로드돼도
+# 그 기간에 진료 기록이 추가·변경된 캠페인만 다시 계산한다 — 지난 캠페인은 열 때 저장된 결과를 조회만 한다.
+# 위치: DASHBOARD_CAMPAIGN_DB 또는 secrets [data_source] campaign_db (기본 data/campaigns.db).
+
+DEFAULT_PATH = "data/campaigns.db"
+SETTING_KEYS = ["campaign_start", "campaign_end", "comparison_option", "custom_before_start", "custom_before_end", "target_regions"]
+FINGERPRINT_COLUMNS = ['진료일자', '환자번호', '초/재진', '행정동']
+
+logger = logging.getLogger("dashboard.registry")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    name TEXT PRIMARY KEY,
+    settings TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    name TEXT PRIMARY KEY REFERENCES campaigns(name) ON DELETE CASCADE,
+    fingerprint TEXT NOT NULL,
+    computed_at TEXT NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_campaigns_signature ON campaigns (signature);
+"""
+
+
+def _encode(settings):
+    return json.dumps(
+        {k: v.isoformat() if isinstance(v, date) else v for k, v in settings.items() if k in SETTING_KEYS},
+        ensure_ascii=False,
+    )
+
+
+def _decode(text):
+    settings = json.loads(text)
+    for key in ("campaign_start", "campaign_end", "custom_before_start", "custom_before_end"):
+        settings[key] = date.fromisoformat(settings[key])
+    return settings
+
+
+def _window(df, params):
+    dates = df['진료일자']
+    mask = pd.Series(False, index=df.index)
+    for lo, hi in cp.campaign_windows(params["campaign_start"], params["campaign_end"], params["before_start"], params["before_end"]):
+        mask |= (dates >= pd.Timestamp(lo)) & (dates <= pd.Timestamp(hi))
+    return df[mask]
+
+
+def fingerprint(window):
+    """캠페인 기간 진료 기록의 지문 — 행이 추가·변경·삭제되면 바뀐다."""
+    rows = window[FINGERPRINT_COLUMNS]
+    return hashlib.sha1(pd.util.hash_pandas_object(rows, index=False).to_numpy().tobytes()).hexdigest()
+
+
+def materialize(window, params):
+    """페이지와 같은 결과 캐시 네임스페이스 → 결과 (window는 campaign_windows 구간의 진료 기록)."""
+    start, end, targets = params["campaign_start"], params["campaign_end"], params["target_regions"]
+    campaign_data, before_data, _ = cp.campaign_periods(window, start, end, params["before_start"], params["before_end"])
+    campaign_target, campaign_non_target = cp.split_target(campaign_data, targets)
+    before_target, before_non_target = cp.split_target(before_data, targets)
+    return {
+        "마케팅.완성도": cp.completeness(campaign_data),
+        "마케팅.KPI": cp.campaign_kpis(campaign_target, before_target),
+        "마케팅.순수효과": cp.new_patient_lift(campaign_target, before_target, campaign_non_target, before_non_target),
+        "마케팅.신뢰구간": cp.lift_intervals(campaign_data, before_data, targets),
+        "마케팅.트렌드": cp.daily_new_trend(window, start, end, targets),
+        "마케팅.지역": cp.region_performance(campaign_data, before_data, targets),
+    }
+
+
+class CampaignRegistry:
+    """로컬 SQLite 캠페인 저장소. 조회마다 연결을 새로 열어 스레드 간에 공유하지 않는다."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 같은 캠페인을 여러 세션이 동시에 갱신하지 않도록
+        self._lock = threading.Lock()
+        with sqlite3.connect(self.path) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def names(self):
+        """최근에 저장한 순서."""
+        with self._connect() as conn:
+            return [r[0] for r in conn.execute("SELECT name FROM campaigns ORDER BY updated_at DESC")]
+
+    def get(self, name):
+        with self._connect() as conn:
+            row = conn.execute("SELECT settings FROM campaigns WHERE name = ?", (name,)).fetchone()
+        return _decode(row[0]) if row else None
+
+    def latest_targets(self):
+        """가장 최근에 저장한 캠페인의 타겟 행정동 (없으면 None) — 새 캠페인의 기본 타겟."""
+        names = self.names()
+        return self.get(names[0])["target_regions"] if names else None
+
+    def save(self, name, settings, df):
+        """캠페인 정의를 저장하고 결과를 바로 계산해 둔다 (같은 이름이면 덮어쓴다)."""
+        params = cp.campaign_params(settings)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO campaigns (name, settings, signature, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET settings = excluded.settings, signature = excluded.signature, updated_at = excluded.updated_at",
+                (name, _encode(settings), signature(params), datetime.now().isoformat(timespec="seconds")),
+            )
+            conn.execute("DELETE FROM results WHERE name = ?", (name,))
+        return self._refresh(name, params, df)
+
+    def delete(self, name):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM campaigns WHERE name = ?", (name,))
+
+    def _refresh(self, name, params, df):
+        """저장된 지문이 현재 데이터와 다를 때만 다시 계산. (결과, 다시 계산했는지)."""
+        window = _window(df, params)
+        current = fingerprint(window)
+        with self._lock:
+            with self._connect() as conn:
+                row = conn.execute("SELECT fingerprint, payload FROM results WHERE name = ?", (name,)).fetchone()
+            if row and row[0] == current:
+                return pickle.loads(row[1]), False
+            results = materialize(window, params)
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (name, fingerprint, computed_at, payload) VALUES (?, ?, ?, ?)",
+                    (name, current, datetime.now().isoformat(timespec="seconds"), pickle.dumps(results)),
+                )
+            logger.info("campaign results refreshed: %s", name)
+            return results, True
+
+    def results_for(self, params, df):
+        """현재 캠페인 조건과 같은 저장 캠페인의 결과 (없으면 None). 기간에 새 진료 기록이 있으면 여기서 갱신."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT name FROM campaigns WHERE signature = ?", (signature(params),)).fetchone()
+        if row is None:
+            return None
+        return self._refresh(row[0], params, df)[0]
+
+    def refresh(self, df):
+        """모든 저장 캠페인 중 기간에 진료 기록이 바뀐 것만 다시 계산. 다시 계산한 캠페인 이름 목록."""
+        refreshed = []
+        for name in self.names():
+            settings = self.get(name)
+            if self._refresh(name, cp.campaign_params(settings), df)[1]:
+                refreshed.append(name)
+        return refreshed
+
+
+# 프로세스당 하나
+@st.cache_resource
+def campaign_registry():
+    return CampaignRegistry(setting("DASHBOARD_CAMPAIGN_DB", "campaign_db", DEFAULT_PATH))
+
+
+def seed(params, results, df):
+    """저장된 결과를 페이지와 같은 키로 결과 캐시에 넣는다 — 이후 섹션은 계산 없이 캐시에서 읽는다."""
+    cache = result_cache()
+    version, sig = snapshot_version(df), signature(params)
+    for namespace, value in results.items():
+        cache.get_or_compute(namespace, version, sig, lambda value=value: value)
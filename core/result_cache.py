@@ -0,0 +1,164 @@
+import datetime as dt
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+
+from core.cache_stats import deep_size
+from core.profiling import count
+
+# 세션 간 계산 결과 캐시
+# 같은 필터로 여는 여러 세션이 KPI·차트 데이터를 한 번만 계산하도록, 정규화한 필터 서명을 키로 결과를 공유한다.
+# 엔트리 수·메모리 상한을 넘으면 가장 오래 쓰지 않은 결과부터 버리고(LRU),
+# 원본 데이터 스냅샷 버전이 바뀌면 해당 네임스페이스의 이전 결과를 모두 버린다.
+# 같은 키를 동시에 요청한 세션들은 먼저 온 세션의 계산을 기다려 결과를 받는다.
+
+MAX_ENTRIES = 256
+MAX_BYTES = 256 * 1024 ** 2
+
+
+def _canonical(value):
+    if isinstance(value, (pd.Timestamp, dt.datetime, dt.date)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        # 멀티셀렉트 값은 선택 순서와 무관하게 같은 조회다
+        return sorted((_canonical(v) for v in value), key=repr)
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def signature(params):
+    """필터 dict → 정규화된 서명(hex)."""
+    payload = json.dumps(_canonical(params), sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def snapshot_version(*frames):
+    """공유 프레임들의 스냅샷 버전 (로더가 attrs["snapshot"]에 기록)."""
+    return "|".join(str(f.attrs.get("snapshot", "")) for f in frames)
+
+
+def _detach(value):
+    # 캐시에 든 결과는 여러 세션이 공유하므로 얕은 사본을 돌려준다.
+    # Copy-on-Write 하에서 호출 측이 열을 추가·수정해도 캐시 원본은 바뀌지 않는다.
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    if isinstance(value, tuple):
+        return tuple(_detach(v) for v in value)
+    if isinstance(value, list):
+        return [_detach(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _detach(v) for k, v in value.items()}
+    return value
+
+
+class ResultCache:
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (namespace, version, sig) -> (value, bytes)
+        self._versions = {}            # namespace -> 현재 스냅샷 버전
+        self._inflight = {}            # key -> Lock (single-flight)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[0]
+
+    def _drop(self, key):
+        _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def _store(self, key, value):
+        namespace, version, _ = key
+        if self._versions.get(namespace) != version:
+            # 스냅샷이 바뀌었으면 이 네임스페이스의 이전 결과는 모두 무효
+            for old in [k for k in self._entries if k[0] == namespace and k[1] != version]:
+                self._drop(old)
+            self._versions[namespace] = version
+        size = deep_size(value)
+        self._entries[key] = (value, size)
+        self.bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get_or_compute(self, namespace, version, sig, compute):
+        key = (namespace, version, sig)
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return _detach(value)
+            flight = self._inflight.setdefault(key, threading.Lock())
+
+        with flight:
+            with self._lock:
+                found, value = self._lookup(key)
+                if found:
+                    return _detach(value)
+                self.misses += 1
+            try:
+                value = compute()
+                with self._lock:
+                    self._store(key, value)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+        return _detach(value)
+
+    def peek(self, namespace, version, sig):
+        with self._lock:
+            return (namespace, version, sig) in self._entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self.bytes = 0
+
+    def report(self):
+        with self._lock:
+            namespaces = pd.Series([k[0] for k in self._entries], dtype=object)
+            sizes = pd.Series([v[1] for v in self._entries.values()], dtype=float)
+            by_ns = (
+                pd.DataFrame({"네임스페이스": namespaces, "메모리(MB)": sizes / 1024 ** 2})
+                .groupby("네임스페이스")
+                .agg(엔트리=("메모리(MB)", "size"), **{"메모리(MB)": ("메모리(MB)", "sum")})
+                .reset_index()
+            )
+            summary = {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+        return summary, by_ns
+
+
+@st.cache_resource
+def result_cache():
+    return ResultCache()
+
+
+def shared_result(namespace, params, compute, *sources):
+    """params로 식별되는 계산 결과를 세션 간에 공유. sources는 결과가 의존하는 공유 프레임."""
+    def counted():
+        # 캐시 미스로 실제 계산한 횟수를 이번 rerun의 작업 카운터에 남긴다
+        count("계산")
+        return compute()
+    return result_cache().get_or_compute(namespace, snapshot_version(*sources), signature(params), counted)
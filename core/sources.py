@@ -0,0 +1,187 @@
+import argparse
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import gspread
+import pandas as pd
+import streamlit as st
+
+# 데이터 원천 어댑터
+# 로더(core/data.py)는 원천에서 '시트 한 장 = 원본 레코드 표'만 받아 전처리한다.
+# 원천은 Google Sheets(운영), 로컬 CSV/Parquet 파일, 로컬 SQLite 중 하나이며 모두 Sheets의 get_all_records와 같은 열·값 형태를 돌려준다.
+# 원천 선택: 환경변수 DASHBOARD_DATA_SOURCE / DASHBOARD_DATA_PATH > secrets의 [data_source] kind / path > 기본값 sheets.
+# 로컬 원천을 쓰면 인증 정보 없이 대시보드 실행·성능 측정·부하 테스트를 할 수 있다.
+
+VISITS = "visits"
+POPULATION = "population"
+TABLES = (VISITS, POPULATION)
+
+# 로컬 SQLite에 만드는 인덱스 (필터·조인에 쓰는 열)
+INDEX_COLUMNS = {
+    VISITS: ["환자번호", "진료일자", "행정동"],
+    POPULATION: ["행정기관"],
+}
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0  # 초 — 재시도마다 두 배, 최대 BACKOFF_MAX
+BACKOFF_MAX = 32.0
+RETRY_STATUS = {429, 500, 502, 503, 504}  # 할당량 초과·일시 오류만 재시도
+
+logger = logging.getLogger("dashboard.data")
+
+
+class DataSource:
+    """원천 인터페이스 — read(table)은 Sheets 레코드와 같은 형태의 DataFrame을 돌려준다."""
+
+    kind = None
+
+    def read(self, table):
+        raise NotImplementedError
+
+    def describe(self):
+        return self.kind
+
+
+def _with_backoff(call, label):
+    """Sheets API 할당량(429)·5xx 오류는 지수 백오프(+지터)로 재시도, 나머지 오류는 그대로 올린다."""
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            return call()
+        except gspread.exceptions.APIError as e:
+            status = getattr(e.response, "status_code", e.code)
+            if status not in RETRY_STATUS or attempt == MAX_ATTEMPTS:
+                raise
+            delay = min(BACKOFF_BASE * 2 ** (attempt - 1), BACKOFF_MAX) + random.uniform(0, BACKOFF_BASE)
+            logger.warning("sheets %s: HTTP %s, retry %d/%d in %.1fs", label, status, attempt, MAX_ATTEMPTS - 1, delay)
+            time.sleep(delay)
+
+
+class SheetsSource(DataSource):
+    """Google Sheets — 서비스 계정 인증과 스프레드시트 열기는 한 번, 이후 조회는 같은 HTTP 세션을 쓴다."""
+
+    kind = "sheets"
+
+    def __init__(self, credentials, sheet_id, worksheets):
+        self._credentials = credentials
+        self._sheet_id = sheet_id
+        self._worksheets = worksheets
+        self._spreadsheet = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        # load_all이 여러 시트를 동시에 읽어도 인증은 한 번만
+        with self._lock:
+            if self._spreadsheet is None:
+                client = gspread.service_account_from_dict(self._credentials)
+                self._spreadsheet = client.open_by_key(self._sheet_id)
+        return self._spreadsheet
+
+    def read(self, table):
+        name = self._worksheets[table]
+        return pd.DataFrame(_with_backoff(lambda: self._open().worksheet(name).get_all_records(), name))
+
+    def describe(self):
+        return "Google Sheets"
+
+
+class FileSource(DataSource):
+    """디렉터리의 {table}.parquet 또는 {table}.csv (UTF-8). 빈 칸은 Sheets처럼 빈 문자열로 읽는다."""
+
+    kind = "files"
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def read(self, table):
+        parquet = self.path / f"{table}.parquet"
+        if parquet.exists():
+            return pd.read_parquet(parquet)
+        return pd.read_csv(self.path / f"{table}.csv", keep_default_na=False, encoding="utf-8-sig")
+
+    def write(self, table, df, fmt="csv"):
+        self.path.mkdir(parents=True, exist_ok=True)
+        if fmt == "parquet":
+            df.to_parquet(self.path / f"{table}.parquet", index=False)
+        else:
+            df.to_csv(self.path / f"{table}.csv", index=False, encoding="utf-8-sig")
+
+    def describe(self):
+        return f"로컬 파일 ({self.path})"
+
+
+class SQLiteSource(DataSource):
+    """로컬 SQLite 파일 — 표 이름은 visits / population. 조회마다 연결을 새로 열어 스레드 간에 공유하지 않는다."""
+
+    kind = "sqlite"
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def read(self, table):
+        with sqlite3.connect(self.path) as conn:
+            return pd.read_sql_query(f'SELECT * FROM "{table}"', conn)
+
+    def write(self, table, df):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with sqlite3.connect(self.path) as conn:
+            df.to_sql(table, conn, if_exists="replace", index=False)
+            for col in INDEX_COLUMNS.get(table, []):
+                if col in df.columns:
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{table}_{col}" ON "{table}" ("{col}")')
+
+    def describe(self):
+        return f"로컬 SQLite ({self.path})"
+
+
+def setting(env, key, default=None):
+    """환경변수 env > secrets [data_source].key > default."""
+    value = os.environ.get(env)
+    if value:
+        return value
+    try:
+        return st.secrets["data_source"][key]
+    except (KeyError, FileNotFoundError):
+        return default
+
+
+def make_source(kind=None, path=None):
+    """설정에 따른 원천. kind·path를 주면 설정 대신 그 값을 쓴다."""
+    kind = kind or setting("DASHBOARD_DATA_SOURCE", "kind", "sheets")
+    path = path or setting("DASHBOARD_DATA_PATH", "path")
+    if kind == "sheets":
+        return SheetsSource(
+            st.secrets["gcp_service_account"],
+            st.secrets["google_sheets"]["sheet_id"],
+            {VISITS: st.secrets["google_sheets"]["worksheet_name"], POPULATION: "연령별인구현황"},
+        )
+    if kind == "files":
+        return FileSource(path or "data")
+    if kind == "sqlite":
+        return SQLiteSource(path or "data/dashboard.db")
+    raise ValueError(f"알 수 없는 데이터 원천: {kind}")
+
+
+# 프로세스당 하나 — Sheets 클라이언트(HTTP 커넥션 풀)를 모든 세션·스레드가 공유
+@st.cache_resource
+def data_source():
+    return make_source()
+
+
+def export(src, dst):
+    """src 원천의 모든 표를 로컬 원천 dst로 복사 (운영 데이터 스냅샷 → 오프라인 실행용)."""
+    for table in TABLES:
+        dst.write(table, src.read(table))
+
+
+if __name__ == "__main__":
+    # 예: python -m core.sources sqlite data/dashboard.db  (현재 설정된 원천 → 로컬 SQLite)
+    parser = argparse.ArgumentParser(description="현재 데이터 원천을 로컬 파일/SQLite로 내보내기")
+    parser.add_argument("kind", choices=["files", "sqlite"])
+    parser.add_argument("path")
+    args = parser.parse_args()
+    export(make_source(), make_source(args.kind, args.path))
@@ -0,0 +1,188 @@
+import argparse
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from core.data import AGE_LABELS
+from core.sources import POPULATION, VISITS, FileSource, SQLiteSource
+
+# 합성 데이터 생성기
+# Sheet1(진료 기록)·연령별인구현황과 같은 열·값 형태의 데이터를 만들어 로컬 원천(core/sources.py)에 쓴다.
+# 운영 규모(1만~1천만 행)의 성능 측정·부하 테스트용이며 실제 환자 정보는 들어가지 않는다.
+# - 환자마다 첫 내원(신환) 후 재방문 횟수·간격이 다르다 (대부분 1~3회, 일부 만성질환 환자는 수십 회)
+#   일부는 데이터 시작 전부터 다니던 기존 환자라 기간 안에는 재진 기록만 있다
+# - 요일(일요일 휴진, 토요일 오전)·계절(겨울 호흡기 유행)·연 성장 추세와 시간대(오전 피크, 점심 공백)를 반영
+# - 행정동 미입력 진료 건, split_address가 처리하는 모든 행정기관 형식(일반 시·구, 구가 있는 시, 세종)과
+#   인구 시트의 시/도·시/군/구 합계 행(split_address가 걸러내는 행)을 포함
+# 사용: python -m core.synthetic --rows 1000000 sqlite data/synthetic.db
+
+# (시/도 약칭, 시/군/구, 행정동, 경도, 위도, 내원 가중치)
+REGIONS = [
+    ("경기", "시흥시", "배곧1동", 126.727, 37.370, 30),
+    ("경기", "시흥시", "배곧2동", 126.735, 37.363, 26),
+    ("경기", "시흥시", "정왕1동", 126.743, 37.347, 9),
+    ("경기", "시흥시", "정왕2동", 126.728, 37.340, 6),
+    ("경기", "시흥시", "정왕본동", 126.738, 37.351, 5),
+    ("경기", "시흥시", "월곶동", 126.742, 37.391, 5),
+    ("경기", "시흥시", "장곡동", 126.783, 37.371, 2),
+    ("경기", "시흥시", "은행동", 126.803, 37.437, 1),
+    ("경기", "안산시 단원구", "고잔동", 126.821, 37.316, 2),
+    ("경기", "안산시 단원구", "와동", 126.823, 37.330, 1),
+    ("경기", "안산시 상록구", "사동", 126.845, 37.300, 1),
+    ("경기", "수원시 장안구", "파장동", 127.000, 37.301, 0.3),
+    ("경기", "광명시", "철산1동", 126.866, 37.476, 0.5),
+    ("인천", "연수구", "송도1동", 126.650, 37.390, 3),
+    ("인천", "연수구", "송도2동", 126.637, 37.380, 2),
+    ("인천", "연수구", "옥련1동", 126.654, 37.422, 0.5),
+    ("인천", "남동구", "논현1동", 126.732, 37.404, 1),
+    ("서울", "강남구", "역삼1동", 127.033, 37.495, 0.5),
+    ("서울", "관악구", "신림동", 126.929, 37.487, 0.3),
+    ("세종", "", "조치원읍", 127.298, 36.601, 0.1),
+]
+
+FULL_NAMES = {"경기": "경기도", "인천": "인천광역시", "서울": "서울특별시", "세종": "세종특별자치시"}
+
+DEFAULT_START = date(2021, 1, 1)
+NO_DONG_RATE = 0.12       # 행정동 미입력 진료 건 비율
+REVISIT_P = 0.35          # 재방문 횟수 기하분포 모수 (평균 재방문 ≈ 1/p - 1)
+CHRONIC_RATE = 0.08       # 정기 방문(만성질환) 환자 비율
+LEAD_DAYS = 3 * 365       # 데이터 시작 전 첫 내원을 뽑는 기간 — 만성질환 환자 방문 기간(최대 약 3년)을 덮는다
+HOUR_WEIGHTS = {9: 14, 10: 16, 11: 14, 12: 8, 13: 2, 14: 10, 15: 11, 16: 10, 17: 8, 18: 5}
+WEEKDAY_WEIGHTS = [1.15, 1.0, 1.0, 1.0, 1.05, 0.6, 0.02]  # 월~일
+
+
+def _day_weights(days):
+    """요일·계절(1~2월·12월 유행)·연 8% 성장 추세를 곱한 일별 내원 가중치."""
+    weekday = np.asarray(WEEKDAY_WEIGHTS)[days.dayofweek.to_numpy()]
+    season = 1 + 0.25 * np.cos(2 * np.pi * (days.month.to_numpy() - 1) / 12)
+    trend = 1.08 ** ((days - days[0]).days.to_numpy() / 365)
+    w = weekday * season * trend
+    return w / w.sum()
+
+
+def _ages(rng, n):
+    # 소아·30~40대 부모·고령층이 두터운 동네 내과 분포
+    mix = rng.choice(3, n, p=[0.2, 0.45, 0.35])
+    ages = np.where(mix == 0, rng.integers(0, 13, n), np.where(mix == 1, rng.normal(38, 8, n), rng.normal(64, 12, n)))
+    return np.clip(ages, 0, 99).astype(np.int64)
+
+
+def generate_visits(rows, start=DEFAULT_START, end=None, seed=0):
+    """Sheet1과 같은 열(진료일자 YYYYMMDD 정수, 진료시간 HHMMSS 정수, …, x, y)의 진료 기록 rows행. 날짜·시간순."""
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start, end or date.today(), freq="D")
+    # 첫 내원은 시작 LEAD_DAYS일 전부터 같은 추세로 뽑는다 — 시작 전에 온 환자가 기간 안에서 재진만 남기는 기존 환자가 되고,
+    # 기간 첫날부터 (기존 환자 재방문 + 새 환자)가 평형 상태라 연간 건수가 추세대로 늘어난다
+    lead = pd.date_range(end=days[0] - pd.Timedelta(days=1), periods=LEAD_DAYS, freq="D")
+    day_w = _day_weights(lead.append(days))
+
+    # 환자 — 필요한 행보다 조금 넉넉히 만들고 행 수에 맞춰 자른다 (시작 전 방문은 버려지므로 그만큼 더)
+    n = int(rows / (1 / REVISIT_P) * 1.3 * (LEAD_DAYS + len(days)) / len(days)) + 10
+    chronic = rng.random(n) < CHRONIC_RATE
+    visits = np.where(chronic, rng.integers(6, 40, n), rng.geometric(REVISIT_P, n))
+    mean_gap = np.where(chronic, 30, 75)
+    first = rng.choice(len(day_w), n, p=day_w) - LEAD_DAYS
+    region_w = np.array([r[5] for r in REGIONS])
+    region = rng.choice(len(REGIONS), n, p=region_w / region_w.sum())
+    ages = _ages(rng, n)
+    gender = np.where(rng.random(n) < 0.54, "F", "M")
+    pid = rng.permutation(n) + 100_000
+    no_dong = rng.random(n) < NO_DONG_RATE
+
+    # 환자별 방문 → 행: 첫 방문 이후 지수분포 간격의 누적
+    owner = np.repeat(np.arange(n), visits)
+    gaps = rng.exponential(mean_gap[owner]).astype(np.int64) + 1
+    starts = np.cumsum(visits) - visits
+    is_first = np.zeros(len(owner), dtype=bool)
+    is_first[starts] = True
+    gaps[is_first] = 0
+    offset = np.cumsum(gaps)
+    offset -= np.repeat(offset[starts], visits)
+    day_idx = first[owner] + offset
+    keep = (day_idx >= 0) & (day_idx < len(days))
+    owner, day_idx, is_first = owner[keep], day_idx[keep], is_first[keep]
+    # 일요일로 떨어진 재방문은 다음 날로
+    day_idx = np.minimum(day_idx + (days.dayofweek.to_numpy()[day_idx] == 6), len(days) - 1)
+
+    # 환자 순서대로 rows행까지 (마지막 환자는 앞쪽 방문만)
+    order = np.argsort(rng.permutation(n)[owner], kind="stable")[:rows]
+    owner, day_idx, is_first = owner[order], day_idx[order], is_first[order]
+
+    hours = np.array(list(HOUR_WEIGHTS))
+    hour_w = np.array(list(HOUR_WEIGHTS.values()), dtype=float)
+    hour = rng.choice(hours, len(owner), p=hour_w / hour_w.sum())
+    hms = hour * 10000 + rng.integers(0, 60, len(owner)) * 100 + rng.integers(0, 60, len(owner))
+
+    reg = region[owner]
+    names = np.array([[r[0], r[1], r[2]] for r in REGIONS], dtype=object)
+    coords = np.array([[r[3], r[4]] for r in REGIONS])
+    dong = names[reg, 2].copy()
+    dong[no_dong[owner]] = ""
+    province = np.array([FULL_NAMES[p] if p == "세종" else p for p in names[:, 0]], dtype=object)[reg]
+
+    df = pd.DataFrame({
+        "진료일자": days.strftime("%Y%m%d").astype(np.int64).to_numpy()[day_idx],
+        "진료시간": hms,
+        "환자번호": pid[owner],
+        "나이": ages[owner],
+        "성별": gender[owner],
+        "초/재진": np.where(is_first, "신환", "재진"),
+        "시/도": province,
+        "시/군/구": names[reg, 1],
+        "행정동": dong,
+        "x": (coords[reg, 0] + rng.normal(0, 0.004, len(owner))).round(6),
+        "y": (coords[reg, 1] + rng.normal(0, 0.003, len(owner))).round(6),
+    })
+    return df.sort_values(["진료일자", "진료시간"], kind="stable").reset_index(drop=True)
+
+
+def generate_population(seed=0, visits=None):
+    """연령별인구현황 — 행정기관(시/도·시/군/구 합계 행 포함), 총 인구수(정수), 연령대별 인구('1,234' 문자열).
+    visits를 주면 행정동 인구를 그 동 환자수의 5배 이상으로 잡아 장악도가 현실적인 범위에 머물게 한다."""
+    rng = np.random.default_rng(seed)
+    # 연령대별 인구 비중 (0~9세 … 100세 이상)
+    shares = np.array([7, 9, 12, 14, 16, 16, 14, 8, 3, 0.8, 0.2])
+    patients = visits.groupby("행정동")["환자번호"].nunique() if visits is not None else pd.Series(dtype=int)
+    rows = []
+    for province, city, dong, *_ in REGIONS:
+        full = FULL_NAMES[province]
+        name = f"{full} {dong}" if province == "세종" else f"{full} {city} {dong}"
+        total = max(int(rng.integers(15_000, 60_000)), int(patients.get(dong, 0)) * 5)
+        ages = rng.multinomial(total, shares / shares.sum())
+        rows.append((full, city, name, ages))
+
+    def record(name, ages):
+        return {"행정기관": name, "총 인구수": int(ages.sum()), **{label: f"{v:,}" for label, v in zip(AGE_LABELS, ages)}}
+
+    records = []
+    # 시/도·시/군/구 합계 행 — split_address가 None을 돌려 로더에서 제외된다
+    for full in dict.fromkeys(r[0] for r in rows):
+        records.append(record(full, sum(r[3] for r in rows if r[0] == full)))
+        for city in dict.fromkeys(r[1] for r in rows if r[0] == full and r[1]):
+            records.append(record(f"{full} {city}", sum(r[3] for r in rows if r[0] == full and r[1] == city)))
+    records += [record(name, ages) for _, _, name, ages in rows]
+    return pd.DataFrame(records)
+
+
+def write(dst, rows, start=DEFAULT_START, end=None, seed=0, **kwargs):
+    """dst(FileSource/SQLiteSource)에 진료 기록 rows행과 인구 시트를 쓴다."""
+    visits = generate_visits(rows, start, end, seed)
+    dst.write(VISITS, visits, **kwargs)
+    dst.write(POPULATION, generate_population(seed, visits), **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="합성 진료 기록·인구 데이터를 로컬 원천으로 생성")
+    parser.add_argument("kind", choices=["files", "parquet", "sqlite"], help="files=CSV 디렉터리, parquet=Parquet 디렉터리")
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--start", type=date.fromisoformat, default=DEFAULT_START)
+    parser.add_argument("--end", type=date.fromisoformat, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.kind == "sqlite":
+        write(SQLiteSource(args.path), args.rows, args.start, args.end, args.seed)
+    else:
+        write(FileSource(args.path), args.rows, args.start, args.end, args.seed,
+              **({"fmt": "parquet"} if args.kind == "parquet" else {}))
@@ -0,0 +1,112 @@
+import streamlit as st
+
+import core.data  # noqa: F401 — 로더를 레지스트리에 등록
+from core.cache_stats import cache_report, invalidate
+from core.prefetch import PREFETCH_TOP_K, prefetcher
+from core.result_cache import result_cache
+from core.sources import data_source
+
+def authenticate():
+    if "authenticated" not in st.session_state:
+        st.session_state.authenticated = False
+
+    if st.session_state.authenticated:
+        return
+
+    pw = st.sidebar.text_input("대시보드 비밀번호", type="password")
+
+    if not pw:
+        st.sidebar.warning("비밀번호를 입력해주세요.")
+        st.stop()
+
+    if pw == st.secrets["general"]["APP_PASSWORD"]:
+        st.session_state.authenticated = True
+        return
+
+    st.sidebar.error("❌ 비밀번호가 틀렸습니다.")
+    st.stop()
+
+st.set_page_config(
+    page_title="캐시 현황",
+    layout="wide",
+    page_icon="서울안녕내과.ico"
+)
+
+authenticate()
+
+st.title("캐시 현황")
+st.caption(f"프로세스 전역 캐시 함수별 호출·적중 횟수, 엔트리 메모리, 마지막 원천({data_source().describe()}) 조회 시각. cache_data는 적중할 때마다 사본을 역직렬화해 반환하고, cache_resource는 모든 세션이 같은 읽기 전용 객체를 공유합니다.")
+
+report = cache_report()
+
+if report.empty:
+    st.info("아직 등록된 캐시 함수가 없습니다.")
+    st.stop()
+
+c1, c2, c3 = st.columns(3)
+c1.metric("캐시 함수", f"{len(report)}개")
+c2.metric("엔트리", f"{int(report['엔트리 수'].sum())}개")
+c3.metric("캐시 메모리", f"{report['메모리(MB)'].sum():,.1f}MB", help="엔트리별 deep memory_usage 합계 (적중 시 반환되는 사본은 제외)")
+
+st.dataframe(
+    report,
+    hide_index=True,
+    width='stretch',
+    column_config={
+        "적중률": st.column_config.ProgressColumn("적중률", format="percent", min_value=0, max_value=1),
+        "메모리(MB)": st.column_config.NumberColumn("메모리(MB)", format="%.1f"),
+        "최고령 엔트리(분)": st.column_config.NumberColumn("최고령 엔트리(분)", format="%.0f"),
+        "마지막 원천 조회": st.column_config.DatetimeColumn("마지막 원천 조회", format="YYYY-MM-DD HH:mm:ss"),
+        "마지막 조회 소요(ms)": st.column_config.NumberColumn("마지막 조회 소요(ms)", format="%.0f"),
+    },
+)
+
+st.markdown("---")
+st.subheader("계산 결과 캐시")
+st.caption(f"같은 필터로 조회한 KPI·차트 데이터를 세션 간에 공유합니다. 최대 {result_cache().max_entries}개 / {result_cache().max_bytes / 1024 ** 2:,.0f}MB, 넘치면 가장 오래 쓰지 않은 결과부터 버리고 원본 스냅샷이 바뀌면 이전 결과를 모두 버립니다.")
+
+summary, by_ns = result_cache().report()
+lookups = summary["hits"] + summary["misses"]
+r1, r2, r3, r4 = st.columns(4)
+r1.metric("결과 엔트리", f"{summary['entries']}개")
+r2.metric("결과 메모리", f"{summary['bytes'] / 1024 ** 2:,.1f}MB")
+r3.metric("적중률", f"{summary['hits'] / lookups:.0%}" if lookups else "-", help=f"적중 {summary['hits']:,}회 / 미스 {summary['misses']:,}회")
+r4.metric("LRU 제거", f"{summary['evictions']:,}회")
+
+pf = prefetcher().report()
+st.caption(
+    f"백그라운드 선계산(서버 기동 시 기본 화면 워밍업 · 드릴다운 상위 {PREFETCH_TOP_K}개 지역): "
+    f"요청 {pf['submitted']:,}건 · 대기 {pf['pending']:,}건 · 이미 캐시됨 {pf['skipped']:,}건 · 실패 {pf['failed']:,}건"
+)
+
+if not by_ns.empty:
+    st.dataframe(
+        by_ns,
+        hide_index=True,
+        width='stretch',
+        column_config={"메모리(MB)": st.column_config.NumberColumn("메모리(MB)", format="%.2f")},
+    )
+
+if st.button("결과 캐시 비우기"):
+    result_cache().clear()
+    st.toast("계산 결과 캐시를 비웠습니다.")
+    st.rerun()
+
+st.markdown("---")
+st.subheader("캐시 무효화")
+st.caption("무효화한 함수는 다음 호출 때 원천 데이터를 다시 조회합니다. 다른 캐시 결과로 만드는 함수(예: load_visits → load_patient_data)는 함께 무효화됩니다.")
+
+col1, col2 = st.columns([3, 1])
+with col1:
+    target = st.selectbox("대상 함수", report["함수"].tolist())
+with col2:
+    st.write("")
+    if st.button("선택 함수 무효화", width='stretch'):
+        cleared = invalidate(target)
+        st.toast(f"{', '.join(cleared)} 캐시를 비웠습니다.")
+        st.rerun()
+
+if st.button("전체 무효화", type="secondary"):
+    invalidate()
+    st.toast("모든 캐시를 비웠습니다.")
+    st.rerun()
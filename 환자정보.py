@@ -1,11 +1,24 @@
+from functools import cache
+
 import streamlit as st
 import pandas as pd
 import altair as alt
 import folium
-import gspread
 from streamlit_folium import st_folium
 from folium.plugins import FastMarkerCluster
 
+from core.prefetch import warm_up
+from core.profiling import fragment, render_overlay, section, start_run
+from core import duck
+from core.comparison import PERIOD_COLORS, compare_periods, monthly_growth, period_bounds, segment_kpis, year_offsets
+from core.data import load_visits, visits_for
+from core.filters import applied_caption, apply_filters, applied_filters
+from core.patients import (
+    TREND_BASES, WEEKDAY_ORDER, age_distribution, data_completeness, default_filters, filter_period,
+    filter_segment, patient_points, view_params, visit_trend, weekday_hour_heatmap,
+)
+from core.result_cache import shared_result
+
 def authenticate():
     if "authenticated" not in st.session_state:
         st.session_state.authenticated = False
@@ -32,7 +45,10 @@ st.set_page_config(
     page_icon="서울안녕내과.ico"
 )
 
+# 기본 화면 백그라운드 선계산 (core.prefetch.warm_up)
+warm_up()
 authenticate()
+start_run("환자정보")
 
 st.markdown("""
 <style>
@@ -41,482 +57,471 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# 1) 데이터 로드 (Google Sheets via API)
-@st.cache_data
-def load_data():
-    creds_dict = st.secrets["gcp_service_account"]
-    client = gspread.service_account_from_dict(creds_dict)
-    sheet_id = st.secrets["google_sheets"]["sheet_id"]
-    worksheet_name = st.secrets["google_sheets"]["worksheet_name"]
-    sheet = client.open_by_key(sheet_id).worksheet(worksheet_name)
-    records = sheet.get_all_records()
-    return pd.DataFrame(records)
-
-df = load_data()
-
-# 2) 전처리
-df['진료일자'] = pd.to_datetime(df['진료일자'], format='%Y%m%d')
-
-def categorize_time(hms):
-    if pd.isna(hms):
-        time_str = '000000'
-    else:
-        try:
-            val = int(hms)
-            time_str = str(val).zfill(6)
-        except:
-            time_str = str(hms).zfill(6)
-    hour = int(time_str[:2])
-    return f"{hour:02d}"
-
-df['진료시간대'] = df['진료시간'].apply(categorize_time)
-
-bins = list(range(0, 101, 10)) + [999]
-labels = ["9세이하"] + [f"{i}대" for i in range(10, 100, 10)] + ["100세이상"]
-df['연령대'] = pd.cut(
-    df['나이'],
-    bins=bins,
-    labels=labels,
-    right=False,
-    include_lowest=True
-)
-
-# 3) 사이드바 필터
-st.sidebar.header("필터 설정")
-start_date = st.sidebar.date_input("시작 진료일자", df['진료일자'].min())
-end_date = st.sidebar.date_input("종료 진료일자", df['진료일자'].max())
-age_band = st.sidebar.multiselect(
-    "연령대",
-    options=df['연령대'].cat.categories.tolist(),
-    default=df['연령대'].cat.categories.tolist()
-)
-gender = st.sidebar.selectbox(
-    "성별",
-    options=["전체"] + df['성별'].dropna().unique().tolist()
-)
-
-filtered = df[
-    (df['진료일자'] >= pd.to_datetime(start_date)) &
-    (df['진료일자'] <= pd.to_datetime(end_date)) &
-    (df['연령대'].isin(age_band))
-]
-if gender != "전체":
-    filtered = filtered[filtered['성별'] == gender]
-
-# 4) KPI 카드
-patients_in_period = len(filtered.drop_duplicates("환자번호"))
-counts_in_period = len(filtered)
-new_patients = filtered[filtered['초/재진'] == "신환"]['환자번호'].nunique()
-return_patients = patients_in_period - new_patients
-new_ratio = new_patients / patients_in_period if patients_in_period else 0
-return_ratio = return_patients / patients_in_period if patients_in_period else 0
-avg_age = filtered['나이'].mean()
+# 1) 데이터 로드 (Google Sheets via API) — 전처리까지 끝난 읽기 전용 공유 프레임
+with section("데이터 로드") as sec:
+    df = load_visits()
+    sec["rows"] = len(df)
+
+# 3) 사이드바 필터 — 폼 안에서 여러 값을 바꾼 뒤 '필터 적용'을 눌러야 한 번에 다시 계산
+age_options = df['연령대'].cat.categories.tolist()
+gender_options = ["전체"] + df['성별'].dropna().unique().tolist()
+filters = applied_filters("환자정보", default_filters(df))
+
+with st.sidebar.form("환자정보_필터"):
+    st.header("필터 설정")
+    staged = {
+        "start_date": st.date_input("시작 진료일자", filters["start_date"]),
+        "end_date": st.date_input("종료 진료일자", filters["end_date"]),
+        "age_band": st.multiselect(
+            "연령대",
+            options=age_options,
+            default=[a for a in filters["age_band"] if a in age_options]
+        ),
+        "gender": st.selectbox(
+            "성별",
+            options=gender_options,
+            index=gender_options.index(filters["gender"]) if filters["gender"] in gender_options else 0
+        ),
+        "compare_years": st.slider("비교 연도 수", 1, 5, filters["compare_years"], help="조회 기간과 비교할 과거 동기 연도 수"),
+    }
+    if st.form_submit_button("필터 적용", type="primary", width="stretch"):
+        apply_filters("환자정보", staged)
+        filters = staged
+    st.caption(applied_caption("환자정보"))
+
+age_band, gender, compare_years = filters["age_band"], filters["gender"], filters["compare_years"]
+
+# 같은 필터의 계산 결과는 세션 간에 공유 — 필터링은 캐시 미스가 난 섹션이 처음 요청할 때 한 번만 수행
+view = view_params(filters)
 
 # 기준 기간 정의
-start = pd.to_datetime(start_date)
-end   = pd.to_datetime(end_date)
-
-# 전년 동기 기간
-ly_start = start - pd.DateOffset(years=1)
-ly_end   = end   - pd.DateOffset(years=1)
-
-# 전년 동기에도 연령대/성별 필터 적용
-ly_filtered = df[
-    (df['진료일자'] >= ly_start) &
-    (df['진료일자'] <= ly_end) &
-    (df['연령대'].isin(age_band))
-]
-if gender != "전체":
-    ly_filtered = ly_filtered[ly_filtered['성별'] == gender]
-
-# 전년 대비 성장률
-ly_total_visits = ly_filtered.shape[0]
-visit_growth = ((counts_in_period - ly_total_visits) / ly_total_visits * 100) if ly_total_visits > 0 else 0
-ly_total_patients = ly_filtered['환자번호'].nunique()
-patient_growth = ((patients_in_period - ly_total_patients) / ly_total_patients * 100) if ly_total_patients > 0 else 0
-ly_new_patients = ly_filtered[ly_filtered['초/재진'] == "신환"]['환자번호'].nunique()
-ly_new_ratio = ly_new_patients / ly_total_patients if ly_total_patients else 0
-new_ratio_delta = (new_ratio - ly_new_ratio) * 100  # %p 변화
-ly_visits_per_patient = ly_total_visits / ly_total_patients if ly_total_patients else 0
-visits_per_patient = counts_in_period / patients_in_period if patients_in_period else 0
-vpp_growth = ((visits_per_patient - ly_visits_per_patient) / ly_visits_per_patient * 100) if ly_visits_per_patient > 0 else 0
-
-col1, col2, col3, col4, col5 = st.columns(5)
-col1.metric("진료 횟수", f"{counts_in_period:,}건", f"{visit_growth:+.1f}%", help="선택 기간 내 총 진료 건수 (전년 동기 대비 증감률)")
-col2.metric("환자수", f"{patients_in_period:,}명", f"{patient_growth:+.1f}%", help="선택 기간 내 고유 환자수 (전년 동기 대비 증감률)")
-col3.metric("신환 비율", f"{new_ratio:.1%}", f"{new_ratio_delta:+.1f}%p", help="전체 환자 중 신환 비율 (전년 동기 대비 %p 변화)")
-col4.metric("인당 진료횟수", f"{visits_per_patient:.1f}건", f"{vpp_growth:+.1f}%", help="진료 횟수 / 환자수. 높을수록 재방문이 활발 (전년 동기 대비 증감률)")
-data_completeness = len(filtered[filtered['행정동'] != '']) / len(filtered) if len(filtered) else 0
-col5.metric("데이터 완성도", f"{data_completeness:.0%}", help="필터된 진료 건 중 행정동 정보가 있는 비율")
-
-st.markdown("---")
-
-# 일별 집계 (filtered 기준)
-curr = (
-    filtered.groupby('진료일자').size()
-    .reset_index(name='진료횟수').sort_values('진료일자')
-)
-ly = (
-    ly_filtered.groupby('진료일자').size()
-    .reset_index(name='진료횟수').sort_values('진료일자')
-)
-
-# 전년 데이터를 '금년 날짜'로 옮겨오기
-ly['pseudo_date'] = ly['진료일자'] + pd.DateOffset(years=1)
-
-# 비교용 컬럼 추가
-curr['year_group'] = '조회 기간'
-ly  ['year_group'] = '전년 동기'
-
-# 날짜 컬럼 통일
-curr['plot_date'] = curr['진료일자']
-ly  ['plot_date'] = ly['pseudo_date']
-
-# 합치기
-comp = pd.concat([curr[['plot_date','진료횟수','year_group', '진료일자']],
-                  ly  [['plot_date','진료횟수','year_group', '진료일자']]])
-comp['날짜'] = comp['진료일자'].dt.strftime('%Y-%m-%d')
-
-comp_area = (
-    alt.Chart(comp)
-      .mark_area(interpolate='monotone', opacity=0.4)
-      .encode(
-          x=alt.X('plot_date:T', title='진료일자', axis=alt.Axis(
-              format='%Y-%m',
-              labelExpr=(
-                  "date(datum.value) === 1 && month(datum.value) === 0 "
-                  "? timeFormat(datum.value, '%Y') "
-                  ": date(datum.value) === 1 "
-                  "? timeFormat(datum.value, '%m') "
-                  ": timeFormat(datum.value, '%m-%d')"
-              )
-          )),
-          y=alt.Y('진료횟수:Q', title='진료횟수', stack=None),
-          color=alt.Color('year_group:N', title='기간',
-                          scale=alt.Scale(domain=['조회 기간','전년 동기'],
-                                          range=['#FFDC3C','#A0AEC0'])),
-          tooltip=[
-            alt.Tooltip('날짜:N', title='날짜'),
-            alt.Tooltip('진료횟수:Q',   title='진료횟수'),
-            alt.Tooltip('year_group:N', title='기간')
-          ]
-      )
-      .properties(height=400)
-      .interactive()
-)
-
-# 필요하다면 투명 포인트로 hover 레이어 추가
-comp_hover = (
-    alt.Chart(comp)
-      .mark_point(size=200, opacity=0)
-      .encode(
-          x='plot_date:T', y='진료횟수:Q',
-          tooltip=[
-            alt.Tooltip('날짜:N', title='날짜'),
-            alt.Tooltip('진료횟수:Q', title='진료횟수'),
-            alt.Tooltip('year_group:N', title='기간')
-          ]
-      )
-)
-
-final_comp_chart = comp_area + comp_hover
-
-# 1) 선택 기간 월별 집계
-curr_monthly = (
-    filtered
-    .groupby(pd.Grouper(key='진료일자', freq='ME'))
-    .size()
-    .reset_index(name='진료횟수')
-)
-# 2) 전년 동기 월별 집계 (위에서 만든 ly_filtered 재사용)
-ly_monthly = (
-    ly_filtered
-    .groupby(pd.Grouper(key='진료일자', freq='ME'))
-    .size()
-    .reset_index(name='진료횟수')
-)
-# 3) 날짜를 비교하기 쉽게 연동
-ly_monthly['진료일자'] = ly_monthly['진료일자'] + pd.DateOffset(years=1)
-# 4) 성장률 계산
-monthly = curr_monthly.merge(
-    ly_monthly.rename(columns={'진료횟수':'ly_진료횟수'}),
-    on='진료일자', how='left'
-)
-monthly['성장률'] = (monthly['진료횟수'] - monthly['ly_진료횟수']) / monthly['ly_진료횟수']
-
-# NaN을 0으로 채우고 int로 변환
-monthly['ly_진료횟수'] = monthly['ly_진료횟수'].fillna(0).astype(int)
-
-monthly['count_label'] = (
-    monthly['ly_진료횟수'].map(lambda x: f"{x:,}건") + "\\n-> " +
-    monthly['진료횟수'].map(lambda x: f"{x:,}건")
-)
-monthly['월'] = monthly['진료일자'].dt.strftime('%Y-%m')
-
-# 5) 월간 성장률 차트
-# 1) 막대 차트
-month_bar = (
-    alt.Chart(monthly)
-      .transform_filter(alt.datum.성장률 != None)
-      .mark_bar()
-      .encode(
-          x=alt.X('yearmonth(진료일자):O', title='진료일자', axis=alt.Axis(labelExpr="timeFormat(datum.value, '%Y-%m')", labelAngle=-45, labelOverlap=False)),
-          y=alt.Y('성장률:Q', axis=alt.Axis(format='.1%', labelExpr="datum.value >= 0 ? format(datum.value, '.0%') + ' 증가' : format(-datum.value, '.0%') + ' 감소'")),
-          tooltip=[
-             alt.Tooltip('월:N', title='월'),
-             alt.Tooltip('성장률:Q',       title='성장률', format='.1%'),
-             alt.Tooltip('진료횟수:Q',             title='이번 년 진료횟수'),
-             alt.Tooltip('ly_진료횟수:Q',          title='전년 동기 진료횟수')
-          ]
-      )
-      .properties(height=300, width={'step':60})
-)
-
-# 2) 성장률 레이블 (막대 위쪽)
-label_rate = (
-    alt.Chart(monthly)
-      .transform_filter(alt.datum.성장률 != None)
-      .mark_text(
-          dy=-50,              # 막대 꼭대기 위로 약간 띄움
-          align='center',
-          baseline='bottom',
-          fontWeight='bold',
-          fontSize=16
-      )
-      .encode(
-          x='yearmonth(진료일자):O',
-          y='성장률:Q',
-          text=alt.Text('성장률:Q', format='.1%')
-      )
-)
-
-# 3) 환자수/전년환자수 레이블 (막대 바로 위나 아래)
-label_count = (
-    alt.Chart(monthly)
-      .transform_filter(alt.datum.성장률 != None)
-      .mark_text(
-          dy=-40,               # 성장률 레이블 바로 아래
-          align='center',
-          baseline='top',
-          fontWeight='bold',
-          lineBreak='\\n',
-          fontSize=14
-      )
-      .encode(
-          x='yearmonth(진료일자):O',
-          y='성장률:Q',
-          text='count_label:N'
-      )
-)
-
-# 막대 + 레이블 합성
-final_month_bar = month_bar + label_rate + label_count
+start = view["start"]
+end   = view["end"]
+
+@cache
+def get_segment():
+    # 연령대/성별 세그먼트는 한 번만 필터링하고, 기간 구분은 비교 엔진에서 처리
+    # 조회 기간·비교 기간에 걸친 진료 기록만 공유 프레임에서 거른다
+    with section("필터링") as sec:
+        bounds = period_bounds(start, end, year_offsets(compare_years))
+        segment = filter_segment(visits_for(bounds), age_band, gender)
+        sec["rows"] = len(segment)
+    return segment
+
+@cache
+def get_filtered():
+    return filter_period(get_segment(), start, end)
+
+# 4) KPI 카드 — 조회 기간 + 과거 N년 동기를 한 번의 그룹 집계로 계산
+with section("비교 엔진") as sec:
+    comp_daily, period_kpis = shared_result(
+        "환자정보.비교", {**view, "compare_years": compare_years},
+        # DuckDB 엔진이 켜져 있으면 세그먼트 프레임을 만들지 않고 SQL로 집계
+        lambda: (
+            duck.compare_periods(df, start, end, year_offsets(compare_years), age_band, gender) if duck.enabled()
+            else compare_periods(get_segment(), start, end, year_offsets(compare_years))
+        ),
+        df,
+    )
 
-# 두 차트를 같은 행에 배치
-col1, col2 = st.columns(2)
+    curr_kpi = period_kpis.loc[0]
+    ly_kpi = period_kpis.loc[1]
+    patients_in_period = int(curr_kpi['환자수'])
+    counts_in_period = int(curr_kpi['진료횟수'])
+    new_ratio = curr_kpi['신환비율']
+    visits_per_patient = curr_kpi['인당진료횟수']
+
+    # 전년 대비 성장률
+    visit_growth = ly_kpi['진료횟수_증감률']
+    patient_growth = ly_kpi['환자수_증감률']
+    new_ratio_delta = ly_kpi['신환비율_증감']  # %p 변화
+    vpp_growth = ly_kpi['인당진료횟수_증감률']
+    sec["rows"] = len(comp_daily)
+
+with section("KPI 카드"):
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("진료 횟수", f"{counts_in_period:,}건", f"{visit_growth:+.1f}%", help="선택 기간 내 총 진료 건수 (전년 동기 대비 증감률)")
+    col2.metric("환자수", f"{patients_in_period:,}명", f"{patient_growth:+.1f}%", help="선택 기간 내 고유 환자수 (전년 동기 대비 증감률)")
+    col3.metric("신환 비율", f"{new_ratio:.1%}", f"{new_ratio_delta:+.1f}%p", help="전체 환자 중 신환 비율 (전년 동기 대비 %p 변화)")
+    col4.metric("인당 진료횟수", f"{visits_per_patient:.1f}건", f"{vpp_growth:+.1f}%", help="진료 횟수 / 환자수. 높을수록 재방문이 활발 (전년 동기 대비 증감률)")
+    completeness = shared_result("환자정보.완성도", view, lambda: data_completeness(get_filtered()), df)
+    col5.metric("데이터 완성도", f"{completeness:.0%}", help="필터된 진료 건 중 행정동 정보가 있는 비율")
+
+    st.markdown("---")
+
+    # 연도별 KPI 비교 (2년 이상 비교 시)
+    if compare_years > 1:
+        with st.expander("연도별 KPI 비교", expanded=False):
+            kpi_table = pd.DataFrame({
+                '기간': period_kpis['기간'],
+                '진료 횟수': period_kpis['진료횟수'].map("{:,}건".format),
+                '환자수': period_kpis['환자수'].map("{:,}명".format),
+                '신환 비율': period_kpis['신환비율'].map("{:.1%}".format),
+                '인당 진료횟수': period_kpis['인당진료횟수'].map("{:.1f}건".format),
+                '조회 기간 진료 증감': period_kpis['진료횟수_증감률'].map("{:+.1f}%".format),
+                '조회 기간 환자 증감': period_kpis['환자수_증감률'].map("{:+.1f}%".format),
+                '조회 기간 신환비율 증감': period_kpis['신환비율_증감'].map("{:+.1f}%p".format),
+            }).iloc[1:]
+            st.dataframe(kpi_table, hide_index=True, width='stretch')
+
+with section("전년 동기 비교 차트") as sec:
+    # 일별 집계 — 과거 기간은 비교 엔진에서 이미 '금년 날짜'(plot_date)로 정렬됨
+    comp = comp_daily.rename(columns={'기간': 'year_group'})
+    comp['날짜'] = comp['진료일자'].dt.strftime('%Y-%m-%d')
+    period_labels = period_kpis['기간'].tolist()
+
+    comp_area = (
+        alt.Chart(comp)
+          .mark_area(interpolate='monotone', opacity=0.4)
+          .encode(
+              x=alt.X('plot_date:T', title='진료일자', axis=alt.Axis(
+                  format='%Y-%m',
+                  labelExpr=(
+                      "date(datum.value) === 1 && month(datum.value) === 0 "
+                      "? timeFormat(datum.value, '%Y') "
+                      ": date(datum.value) === 1 "
+                      "? timeFormat(datum.value, '%m') "
+                      ": timeFormat(datum.value, '%m-%d')"
+                  )
+              )),
+              y=alt.Y('진료횟수:Q', title='진료횟수', stack=None),
+              color=alt.Color('year_group:N', title='기간',
+                              scale=alt.Scale(domain=period_labels,
+                                              range=PERIOD_COLORS[:len(period_labels)])),
+              tooltip=[
+                alt.Tooltip('날짜:N', title='날짜'),
+                alt.Tooltip('진료횟수:Q',   title='진료횟수'),
+                alt.Tooltip('year_group:N', title='기간')
+              ]
+          )
+          .properties(height=400)
+          .interactive()
+    )
 
-with col1:
-    st.subheader("전년 동기 내원 추이 비교")
-    st.altair_chart(final_comp_chart, width='stretch')
+    # 필요하다면 투명 포인트로 hover 레이어 추가
+    comp_hover = (
+        alt.Chart(comp)
+          .mark_point(size=200, opacity=0)
+          .encode(
+              x='plot_date:T', y='진료횟수:Q',
+              tooltip=[
+                alt.Tooltip('날짜:N', title='날짜'),
+                alt.Tooltip('진료횟수:Q', title='진료횟수'),
+                alt.Tooltip('year_group:N', title='기간')
+              ]
+          )
+    )
 
-with col2:
-    st.subheader("월간 성장률")
-    st.altair_chart(final_month_bar, width='stretch')
+    final_comp_chart = comp_area + comp_hover
+    sec["rows"] = len(comp)
 
-# 5) 내원 추이 (토글 가능한 추세선)
-st.subheader("내원 추이")
-agg_basis = st.radio("집계 기준", ["일별", "주별", "월별", "년별"], horizontal=True)
+with section("월간 성장률 차트") as sec:
+    # 선택 기간 월별 집계 + 전년 동기 대비 성장률 (비교 엔진 일별 결과 재사용)
+    monthly = monthly_growth(comp_daily, period=1)
 
-# 집계 기준에 따른 groupby 분기
-if agg_basis == "일별":
-    daily = (
-        filtered
-        .groupby('진료일자')
-        .size()
-        .reset_index(name='진료횟수')
-        .sort_values('진료일자')
+    monthly['count_label'] = (
+        monthly['ly_진료횟수'].map(lambda x: f"{x:,}건") + "\\n-> " +
+        monthly['진료횟수'].map(lambda x: f"{x:,}건")
     )
-else:
-    freq_map = {"주별": "W", "월별": "ME", "년별": "YE"}
-    daily = (
-        filtered
-        .groupby(pd.Grouper(key='진료일자', freq=freq_map[agg_basis]))
-        .size()
-        .reset_index(name='진료횟수')
-        .sort_values('진료일자')
+    monthly['월'] = monthly['진료일자'].dt.strftime('%Y-%m')
+
+    # 5) 월간 성장률 차트
+    # 1) 막대 차트
+    month_bar = (
+        alt.Chart(monthly)
+          .transform_filter(alt.datum.성장률 != None)
+          .mark_bar()
+          .encode(
+              x=alt.X('yearmonth(진료일자):O', title='진료일자', axis=alt.Axis(labelExpr="timeFormat(datum.value, '%Y-%m')", labelAngle=-45, labelOverlap=False)),
+              y=alt.Y('성장률:Q', axis=alt.Axis(format='.1%', labelExpr="datum.value >= 0 ? format(datum.value, '.0%') + ' 증가' : format(-datum.value, '.0%') + ' 감소'")),
+              tooltip=[
+                 alt.Tooltip('월:N', title='월'),
+                 alt.Tooltip('성장률:Q',       title='성장률', format='.1%'),
+                 alt.Tooltip('진료횟수:Q',             title='이번 년 진료횟수'),
+                 alt.Tooltip('ly_진료횟수:Q',          title='전년 동기 진료횟수')
+              ]
+          )
+          .properties(height=300, width={'step':60})
     )
 
-# 이동평균 컬럼 추가
-daily['MA6']  = daily['진료횟수'].rolling(window=6,  min_periods=1).mean()
-daily['MA30'] = daily['진료횟수'].rolling(window=30, min_periods=1).mean()
-daily['MA60'] = daily['진료횟수'].rolling(window=60, min_periods=1).mean()
-daily['MA90'] = daily['진료횟수'].rolling(window=90, min_periods=1).mean()
-
-# long form 변환
-melted = daily.melt(
-    id_vars='진료일자',
-    value_vars=['진료횟수','MA6','MA30','MA60','MA90'],
-    var_name='지표',
-    value_name='값'
-)
-melted['날짜'] = melted['진료일자'].dt.strftime('%Y-%m-%d')
-# 범례 클릭으로 토글할 셀렉션
-legend_sel = alt.selection_point(fields=['지표'], bind='legend', value=[{'지표': 'MA30'}])
-
-# x축 공통 설정
-x_axis = alt.X('진료일자:T', title='날짜', axis=alt.Axis(
-    format='%Y-%m',
-    labelExpr=(
-        "date(datum.value) === 1 && month(datum.value) === 0 "
-        "? timeFormat(datum.value, '%Y') "
-        ": date(datum.value) === 1 "
-        "? timeFormat(datum.value, '%m') "
-        ": timeFormat(datum.value, '%m-%d')"
+    # 2) 성장률 레이블 (막대 위쪽)
+    label_rate = (
+        alt.Chart(monthly)
+          .transform_filter(alt.datum.성장률 != None)
+          .mark_text(
+              dy=-50,              # 막대 꼭대기 위로 약간 띄움
+              align='center',
+              baseline='bottom',
+              fontWeight='bold',
+              fontSize=16
+          )
+          .encode(
+              x='yearmonth(진료일자):O',
+              y='성장률:Q',
+              text=alt.Text('성장률:Q', format='.1%')
+          )
+    )
+
+    # 3) 환자수/전년환자수 레이블 (막대 바로 위나 아래)
+    label_count = (
+        alt.Chart(monthly)
+          .transform_filter(alt.datum.성장률 != None)
+          .mark_text(
+              dy=-40,               # 성장률 레이블 바로 아래
+              align='center',
+              baseline='top',
+              fontWeight='bold',
+              lineBreak='\\n',
+              fontSize=14
+          )
+          .encode(
+              x='yearmonth(진료일자):O',
+              y='성장률:Q',
+              text='count_label:N'
+          )
     )
-))
-
-# 진료횟수: 얇은 area (배경, 항상 표시)
-area_chart = (
-    alt.Chart(melted)
-       .transform_filter(alt.datum.지표 == '진료횟수')
-       .mark_area(opacity=0.15, color='#FFDC3C', line={'strokeWidth': 1, 'color': '#D4A800'})
-       .encode(
-           x=x_axis,
-           y=alt.Y('값:Q', title='진료횟수'),
-           tooltip=[
-               alt.Tooltip('날짜:N', title='날짜'),
-               alt.Tooltip('값:Q',        title='진료횟수')
-           ]
-       )
-)
 
-# MA 라인: 범례 토글
-ma_chart = (
-    alt.Chart(melted)
-       .transform_filter(alt.datum.지표 != '진료횟수')
-       .mark_line(strokeWidth=2)
-       .encode(
-           x=x_axis,
-           y='값:Q',
-           color=alt.Color(
-               '지표:N',
-               scale=alt.Scale(
-                   domain=['MA6','MA30','MA60','MA90'],
-                   range=['#4BA3C7','#00C49A','#FF8C42','#9B59B6']
+    # 막대 + 레이블 합성
+    final_month_bar = month_bar + label_rate + label_count
+    sec["rows"] = len(monthly)
+
+with section("비교 차트 렌더링"):
+    # 두 차트를 같은 행에 배치
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("전년 동기 내원 추이 비교")
+        st.altair_chart(final_comp_chart, width='stretch')
+
+    with col2:
+        st.subheader("월간 성장률")
+        st.altair_chart(final_month_bar, width='stretch')
+
+# 5) 내원 추이 (토글 가능한 추세선) — 집계 기준을 바꾸면 이 섹션만 다시 실행
+@fragment("내원 추이")
+def visit_trend_section():
+    with section("내원 추이") as sec:
+        st.subheader("내원 추이")
+        agg_basis = st.radio("집계 기준", TREND_BASES, horizontal=True)
+
+        # 집계 기준별 진료횟수 + 이동평균
+        daily = shared_result("환자정보.추이", {**view, "basis": agg_basis}, lambda: visit_trend(get_filtered(), agg_basis), df)
+
+        # long form 변환
+        melted = daily.melt(
+            id_vars='진료일자',
+            value_vars=['진료횟수','MA6','MA30','MA60','MA90'],
+            var_name='지표',
+            value_name='값'
+        )
+        melted['날짜'] = melted['진료일자'].dt.strftime('%Y-%m-%d')
+        # 범례 클릭으로 토글할 셀렉션
+        legend_sel = alt.selection_point(fields=['지표'], bind='legend', value=[{'지표': 'MA30'}])
+
+        # x축 공통 설정
+        x_axis = alt.X('진료일자:T', title='날짜', axis=alt.Axis(
+            format='%Y-%m',
+            labelExpr=(
+                "date(datum.value) === 1 && month(datum.value) === 0 "
+                "? timeFormat(datum.value, '%Y') "
+                ": date(datum.value) === 1 "
+                "? timeFormat(datum.value, '%m') "
+                ": timeFormat(datum.value, '%m-%d')"
+            )
+        ))
+
+        # 진료횟수: 얇은 area (배경, 항상 표시)
+        area_chart = (
+            alt.Chart(melted)
+               .transform_filter(alt.datum.지표 == '진료횟수')
+               .mark_area(opacity=0.15, color='#FFDC3C', line={'strokeWidth': 1, 'color': '#D4A800'})
+               .encode(
+                   x=x_axis,
+                   y=alt.Y('값:Q', title='진료횟수'),
+                   tooltip=[
+                       alt.Tooltip('날짜:N', title='날짜'),
+                       alt.Tooltip('값:Q',        title='진료횟수')
+                   ]
                )
-           ),
-           opacity=alt.condition(legend_sel, alt.value(1), alt.value(0.1)),
-           tooltip=[
-               alt.Tooltip('날짜:N', title='날짜'),
-               alt.Tooltip('지표:N',      title='지표'),
-               alt.Tooltip('값:Q',        title='진료횟수')
-           ]
-       )
-       .add_params(legend_sel)
-       .interactive()
-       .properties(height=400)
-)
+        )
 
-daily_hover = (
-    alt.Chart(melted)
-       .mark_point(size=200, opacity=0)
-       .transform_filter(alt.datum.지표=='진료횟수')
-       .encode(
-            x='진료일자:T', y='값:Q',
-            tooltip=[
-                alt.Tooltip('날짜:N', title='날짜'),
-                alt.Tooltip('값:Q',        title='진료횟수')
-            ]
+        # MA 라인: 범례 토글
+        ma_chart = (
+            alt.Chart(melted)
+               .transform_filter(alt.datum.지표 != '진료횟수')
+               .mark_line(strokeWidth=2)
+               .encode(
+                   x=x_axis,
+                   y='값:Q',
+                   color=alt.Color(
+                       '지표:N',
+                       scale=alt.Scale(
+                           domain=['MA6','MA30','MA60','MA90'],
+                           range=['#4BA3C7','#00C49A','#FF8C42','#9B59B6']
+                       )
+                   ),
+                   opacity=alt.condition(legend_sel, alt.value(1), alt.value(0.1)),
+                   tooltip=[
+                       alt.Tooltip('날짜:N', title='날짜'),
+                       alt.Tooltip('지표:N',      title='지표'),
+                       alt.Tooltip('값:Q',        title='진료횟수')
+                   ]
+               )
+               .add_params(legend_sel)
+               .interactive()
+               .properties(height=400)
         )
-)
 
-trend_hover = (
-    alt.Chart(melted)
-       .mark_point(size=200, opacity=0)
-       .transform_filter(alt.datum.지표!='진료횟수')
-       .encode(
-            x='진료일자:T', y='값:Q',
-            tooltip=[
-                alt.Tooltip('날짜:N', title='날짜'),
-                alt.Tooltip('지표:N',      title='지표'),
-                alt.Tooltip('값:Q',        title='진료횟수')
-            ]
+        daily_hover = (
+            alt.Chart(melted)
+               .mark_point(size=200, opacity=0)
+               .transform_filter(alt.datum.지표=='진료횟수')
+               .encode(
+                    x='진료일자:T', y='값:Q',
+                    tooltip=[
+                        alt.Tooltip('날짜:N', title='날짜'),
+                        alt.Tooltip('값:Q',        title='진료횟수')
+                    ]
+                )
         )
-)
 
-final_chart = (
-    alt.layer(area_chart, ma_chart, daily_hover, trend_hover)
-       .resolve_scale(y='shared')
-       .properties(
-           width='container',
-           autosize={'type':'fit-x','contains':'padding'}
-       )
-)
-st.altair_chart(final_chart, width='stretch')
+        trend_hover = (
+            alt.Chart(melted)
+               .mark_point(size=200, opacity=0)
+               .transform_filter(alt.datum.지표!='진료횟수')
+               .encode(
+                    x='진료일자:T', y='값:Q',
+                    tooltip=[
+                        alt.Tooltip('날짜:N', title='날짜'),
+                        alt.Tooltip('지표:N',      title='지표'),
+                        alt.Tooltip('값:Q',        title='진료횟수')
+                    ]
+                )
+        )
+
+        final_chart = (
+            alt.layer(area_chart, ma_chart, daily_hover, trend_hover)
+               .resolve_scale(y='shared')
+               .properties(
+                   width='container',
+                   autosize={'type':'fit-x','contains':'padding'}
+               )
+        )
+        st.altair_chart(final_chart, width='stretch')
+        sec["rows"] = len(melted)
+
+visit_trend_section()
 
 # 7) 요일×시간대 히트맵
-st.subheader("요일×시간대 내원 패턴")
-day_kr = {'Monday':'월요일','Tuesday':'화요일','Wednesday':'수요일','Thursday':'목요일','Friday':'금요일','Saturday':'토요일','Sunday':'일요일'}
-filtered['요일'] = filtered['진료일자'].dt.day_name().map(day_kr)
-heat = filtered.groupby(['요일', '진료시간대']).size().reset_index(name='count')
-heat_chart = alt.Chart(heat).mark_rect().encode(
-    x=alt.X('진료시간대:O', title="시간대", axis=alt.Axis(labelAngle=0)),
-    y=alt.Y('요일:O', sort=['월요일','화요일','수요일','목요일','금요일','토요일','일요일']),
-    color=alt.Color('count:Q', scale=alt.Scale(scheme='blues'), title='내원수')
-)
-st.altair_chart(heat_chart, width='stretch')
+with section("요일×시간대 히트맵") as sec:
+    st.subheader("요일×시간대 내원 패턴")
+    heat = shared_result("환자정보.히트맵", view, lambda: weekday_hour_heatmap(get_filtered()), df)
+    heat_chart = alt.Chart(heat).mark_rect().encode(
+        x=alt.X('진료시간대:O', title="시간대", axis=alt.Axis(labelAngle=0)),
+        y=alt.Y('요일:O', sort=WEEKDAY_ORDER),
+        color=alt.Color('count:Q', scale=alt.Scale(scheme='blues'), title='내원수')
+    )
+    st.altair_chart(heat_chart, width='stretch')
+    sec["rows"] = len(heat)
+
+# 7) 환자 지도 분포 + 연령대별 환자 분포 — 화면 아래쪽 무거운 섹션이라 펼쳤을 때만 계산
+# (펼치고 접는 동작은 fragment라 해당 섹션만 다시 실행되고, 결과는 필터 서명별로 결과 캐시에 남는다)
+@fragment("환자 지도")
+def map_section():
+    with st.expander("환자 지도 분포", key="lazy_map", on_change="rerun") as panel:
+        if not panel.open:
+            return
+        with section("환자 지도") as sec:
+            m = folium.Map(location=[37.5665, 126.9780], zoom_start=7)
+            folium.plugins.Fullscreen().add_to(m)
+            data = shared_result("환자정보.지도", view, lambda: patient_points(get_filtered()), df)
+            FastMarkerCluster(data).add_to(m)
+            st_folium(m, width=None, height=600, returned_objects=[])
+            sec["rows"] = len(data)
+
+@fragment("연령대 분포")
+def age_section():
+    with st.expander("연령대별 환자 분포", key="lazy_age", on_change="rerun") as panel:
+        if not panel.open:
+            return
+        with section("연령대 분포") as sec:
+            age_order = ["9세이하"] + [f"{i}대" for i in range(10, 100, 10)] + ["100세이상"]
+            age_dist = shared_result("환자정보.연령대", view, lambda: age_distribution(get_filtered()), df)
+
+            bar = (
+                alt.Chart(age_dist)
+                .mark_bar(cornerRadiusEnd=4)
+                .encode(
+                    y=alt.Y('연령대:N', sort=age_order, title=None, axis=alt.Axis(labelFontSize=13)),
+                    x=alt.X('환자수:Q', title='환자수', axis=alt.Axis(labelFontSize=11)),
+                    color=alt.Color('환자수:Q', scale=alt.Scale(scheme='tealblues'), legend=None),
+                    tooltip=[
+                        alt.Tooltip('연령대:N', title='연령대'),
+                        alt.Tooltip('환자수:Q', title='환자수', format=','),
+                        alt.Tooltip('비율:Q', title='비율', format='.1%')
+                    ]
+                )
+            )
+
+            label = (
+                alt.Chart(age_dist)
+                .mark_text(align='left', dx=4, fontSize=12, fontWeight='bold')
+                .encode(
+                    y=alt.Y('연령대:N', sort=age_order),
+                    x=alt.X('환자수:Q'),
+                    text=alt.Text('비율:Q', format='.1%')
+                )
+            )
+
+            st.altair_chart(bar + label, width='stretch', height=600)
+            sec["rows"] = len(age_dist)
 
-# 7) 환자 지도 분포 + 연령대별 환자 분포
 map_col, donut_col = st.columns(2)
-
 with map_col:
-    st.subheader("환자 지도 분포")
-    m = folium.Map(location=[37.5665, 126.9780], zoom_start=7)
-    folium.plugins.Fullscreen().add_to(m)
-    unique_patients = filtered.drop_duplicates(subset='환자번호').copy()
-    unique_patients['x'] = unique_patients['x'].replace("", pd.NA)
-    unique_patients['y'] = unique_patients['y'].replace("", pd.NA)
-    data = list(unique_patients.dropna(subset=['y','x'])[['y','x']].itertuples(index=False, name=None))
-    FastMarkerCluster(data).add_to(m)
-    st_folium(m, width=None, height=600, returned_objects=[])
-
+    map_section()
 with donut_col:
-    st.subheader("연령대별 환자 분포")
-    age_order = ["9세이하"] + [f"{i}대" for i in range(10, 100, 10)] + ["100세이상"]
-    age_dist = (
-        filtered.drop_duplicates(subset='환자번호')
-        .groupby('연령대', observed=False)['환자번호']
-        .nunique()
-        .reset_index(name='환자수')
-    )
-    age_dist = age_dist[age_dist['환자수'] > 0]
-    total = age_dist['환자수'].sum()
-    age_dist['비율'] = age_dist['환자수'] / total
-
-    bar = (
-        alt.Chart(age_dist)
-        .mark_bar(cornerRadiusEnd=4)
-        .encode(
-            y=alt.Y('연령대:N', sort=age_order, title=None, axis=alt.Axis(labelFontSize=13)),
-            x=alt.X('환자수:Q', title='환자수', axis=alt.Axis(labelFontSize=11)),
-            color=alt.Color('환자수:Q', scale=alt.Scale(scheme='tealblues'), legend=None),
-            tooltip=[
-                alt.Tooltip('연령대:N', title='연령대'),
-                alt.Tooltip('환자수:Q', title='환자수', format=','),
-                alt.Tooltip('비율:Q', title='비율', format='.1%')
-            ]
-        )
-    )
-
-    label = (
-        alt.Chart(age_dist)
-        .mark_text(align='left', dx=4, fontSize=12, fontWeight='bold')
-        .encode(
-            y=alt.Y('연령대:N', sort=age_order),
-            x=alt.X('환자수:Q'),
-            text=alt.Text('비율:Q', format='.1%')
-        )
-    )
-
-    st.altair_chart(bar + label, width='stretch', height=600)
-
+    age_section()
+
+# 8) 세그먼트 KPI 매트릭스 — 사이드바 연령대/성별 필터와 무관하게 모든 연령대 × 성별 × 시/군/구 칸을
+# 조회 기간·전년 동기 그룹 집계 한 번으로 계산 (열 머리글을 눌러 정렬)
+@fragment("세그먼트 KPI")
+def segment_section():
+    with st.expander("세그먼트별 KPI (연령대 × 성별 × 시/군/구)", key="lazy_segment", on_change="rerun") as panel:
+        if not panel.open:
+            return
+        with section("세그먼트 KPI") as sec:
+            kpis = shared_result(
+                "환자정보.세그먼트KPI", {"start": start, "end": end},
+                lambda: segment_kpis(visits_for(period_bounds(start, end, year_offsets(1))), start, end),
+                df,
+            )
+            min_visits = st.number_input("최소 진료 건수", 0, value=30, step=10, key="segment_min_visits",
+                                         help="조회 기간 진료 건수가 이보다 적은 세그먼트는 숨깁니다 (증감률이 한두 건에 크게 흔들림)")
+            shown = kpis[kpis['진료횟수'] >= min_visits]
+            st.dataframe(
+                shown,
+                hide_index=True,
+                width='stretch',
+                column_config={
+                    '진료횟수': st.column_config.NumberColumn('진료 횟수', format="%d"),
+                    '진료횟수_증감률': st.column_config.NumberColumn('진료 증감', format="%+.1f%%"),
+                    '환자수': st.column_config.NumberColumn('환자수', format="%d"),
+                    '환자수_증감률': st.column_config.NumberColumn('환자 증감', format="%+.1f%%"),
+                    '신환비율': st.column_config.NumberColumn('신환 비율', format="percent"),
+                    '신환비율_증감': st.column_config.NumberColumn('신환비율 증감', format="%+.1f%%p"),
+                    '인당진료횟수': st.column_config.NumberColumn('인당 진료횟수', format="%.2f"),
+                    '인당진료횟수_증감률': st.column_config.NumberColumn('인당 증감', format="%+.1f%%"),
+                    '전년_진료횟수': st.column_config.NumberColumn('전년 동기 진료', format="%d"),
+                },
+                column_order=[
+                    '연령대', '성별', '시/도', '시/군/구',
+                    '진료횟수', '진료횟수_증감률', '환자수', '환자수_증감률',
+                    '신환비율', '신환비율_증감', '인당진료횟수', '인당진료횟수_증감률', '전년_진료횟수',
+                ],
+            )
+            st.caption(f"{len(shown):,}개 세그먼트 (전체 {len(kpis):,}개) · 증감은 전년 동기 대비, 전년 동기 기록이 없으면 빈 칸")
+            sec["rows"] = len(kpis)
+
+segment_section()
+
+render_overlay()